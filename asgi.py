@@ -0,0 +1,234 @@
+"""ASGI serving for the Flask apps.
+
+``ASGIApp`` wraps a Flask app so it can run under an ASGI server such as
+uvicorn (``uvicorn app:asgi_app``). Routes registered with ``ASGIApp.route``
+are coroutines that run on the event loop inside a normal Flask request
+context, so ``request``, ``session``, the before/after request hooks and
+error handlers all behave as usual; while they await the LLM they hold no
+thread, and one process can keep hundreds of such requests waiting. The
+session is loaded, and the response finalized and the session saved, on a
+thread, since session backends may read and write disk.
+
+An async route can stream by returning a response whose body is an async
+iterator (e.g. an async generator of Server-Sent Events); its chunks are
+awaited and sent from the event loop, so a long stream holds no thread.
+
+Every other request goes to the WSGI app on a bounded thread pool, the
+response body (streamed ones included) being read on that pool too. Keep the
+async routes free of slow blocking calls: anything that blocks runs on the
+event loop and stalls every other request.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask.ctx import RequestContext
+
+
+class ASGIApp:
+    """An ASGI application serving ``flask_app`` with optional async routes."""
+
+    def __init__(self, flask_app, max_threads=32):
+        self.app = flask_app
+        self.max_threads = max_threads
+        self._routes = {}
+        self._executor = None
+
+    def route(self, path, methods=("GET",)):
+        """Register a coroutine function to handle ``path`` for ``methods``.
+
+        The path must also be a route of the Flask app (which still serves
+        it under WSGI); the coroutine gets the same view arguments.
+        """
+        def decorator(view):
+            for method in methods:
+                self._routes[(method.upper(), path)] = view
+            return view
+        return decorator
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="asgi")
+        return self._executor
+
+    async def run_sync(self, fn, *args, context=None):
+        """Run a blocking call on the thread pool, in ``context`` or a copy of the current one."""
+        if context is None:
+            context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        environ = build_environ(scope, await read_body(receive))
+        view = self._routes.get((scope["method"], scope["path"]))
+        if view is not None:
+            response = await self._dispatch(view, environ)
+            if hasattr(response.response, "__aiter__"):
+                await self._send_async(response, environ, send)
+            else:
+                await self._send_wsgi(response, environ, send, blocking=response.is_streamed)
+        else:
+            await self._send_wsgi(self.app.wsgi_app, environ, send, blocking=True)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, view, environ):
+        """Run an async view the way Flask's ``full_dispatch_request`` runs a sync one."""
+        app = self.app
+        request = app.request_class(environ)
+        request.json_module = app.json
+        # Opened here, on a thread, instead of by push() on the event loop
+        session = await asyncio.to_thread(app.session_interface.open_session, app, request)
+        if session is None:
+            session = app.session_interface.make_null_session(app)
+        ctx = RequestContext(app, environ, request=request, session=session)
+        error = None
+        try:
+            ctx.push()
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**(ctx.request.view_args or {}))
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            # The after_request hooks and the session save, in this context
+            return await asyncio.to_thread(app.finalize_request, rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _send_async(self, response, environ, send):
+        """Relay a response whose body is an async iterator, awaiting each chunk on the event loop."""
+        headers = response.get_wsgi_headers(environ).to_wsgi_list()
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        body = response.response
+        try:
+            async for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            aclose = getattr(body, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            response.close()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_wsgi(self, wsgi_app, environ, send, blocking):
+        """Call a WSGI callable and relay its response; on the thread pool if ``blocking``.
+
+        The calls for one response share a context, so a streamed body can
+        resume on a different thread than it started on.
+        """
+        started = {}
+        context = contextvars.copy_context()
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            return lambda data: None
+
+        if blocking:
+            body = await self.run_sync(wsgi_app, environ, start_response, context=context)
+        else:
+            body = wsgi_app(environ, start_response)
+        chunks = iter(body)
+        try:
+            while True:
+                if blocking:
+                    chunk = await self.run_sync(next, chunks, None, context=context)
+                else:
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if not chunk:
+                    continue
+                if "sent" not in started:
+                    await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+                    started["sent"] = True
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                if blocking:
+                    await self.run_sync(close, context=context)
+                else:
+                    close()
+
+        if "sent" not in started:
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def read_body(receive):
+    """Read the whole request body from ASGI ``http.request`` messages."""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.extend(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return bytes(body)
+
+
+def build_environ(scope, body):
+    """The WSGI environ for an ASGI HTTP scope and its body."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
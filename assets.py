@@ -0,0 +1,235 @@
+"""Fingerprinted, precompressed static asset bundles.
+
+The pages' CSS and the chat widget script live under ``static/css`` and
+``static/js``. ``build`` concatenates them into the bundles listed in
+``BUNDLES``, names each file after a hash of its content (so a changed
+bundle gets a new URL) and writes gzip and, when the optional ``brotli``
+package is installed, brotli variants next to it, plus a ``manifest.json``
+mapping bundle names to files.
+
+``AssetPipeline`` serves the built files from ``/assets/`` with a one-year
+``immutable`` Cache-Control, picking the precompressed variant the client
+accepts, and adds an ``asset_url(name)`` helper to Jinja. Run
+``python assets.py build`` as part of a deploy; by default the app also
+builds on startup when the manifest is missing or older than the sources,
+one process at a time under a lock file in ``static/dist``.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are built without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+# Bundle name -> source files (relative to static/), concatenated in order
+BUNDLES = {
+    "chat-widget.js": ["js/chat-widget.js"],
+    "feature.css": ["css/feature-page.css", "css/chat-basic.css"],
+    "landing.css": ["css/landing.css"],
+    "login.css": ["css/login.css", "css/chat.css"],
+    "mentor.css": ["css/mentor.css"],
+    "dashboard_selection.css": ["css/dashboard_selection.css", "css/chat-basic.css"],
+    "study_dashboard.css": ["css/study_dashboard.css", "css/chat.css"],
+    "career_dashboard.css": ["css/career_dashboard.css"],
+    "recommendations.css": ["css/recommendations.css"],
+    "index.css": ["css/index.css"],
+}
+
+# Compressed variants, preferred in this order
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if brotli else [("gzip", ".gz")]
+
+# Smaller files aren't worth compressing
+MIN_COMPRESS_BYTES = 512
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Old builds younger than this are kept: pages rendered by workers that
+# haven't restarted yet still link to them
+KEEP_OLD_BUILDS_SECONDS = 600
+
+BUILD_LOCK_NAME = ".build.lock"
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR, bundles=BUNDLES):
+    """Build every bundle into ``dist_dir`` and return the manifest.
+
+    Holds the build lock, so processes starting together build one at a
+    time. Files left over from earlier builds are removed once they are
+    older than KEEP_OLD_BUILDS_SECONDS.
+    """
+    with build_lock(dist_dir):
+        return _build(static_dir, dist_dir, bundles)
+
+
+@contextmanager
+def build_lock(dist_dir, ttl=120, timeout=120, poll_interval=0.1):
+    """Hold a cross-process lock file in ``dist_dir`` while building.
+
+    A lock file older than ``ttl`` seconds is treated as abandoned. Raises
+    TimeoutError if the lock can't be taken within ``timeout``.
+    """
+    os.makedirs(dist_dir, exist_ok=True)
+    path = os.path.join(dist_dir, BUILD_LOCK_NAME)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > ttl:
+                    os.unlink(path)
+                    continue
+            except FileNotFoundError:
+                continue
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for the asset build lock in {dist_dir}")
+        time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _build(static_dir, dist_dir, bundles):
+    manifest = {}
+    for name, sources in bundles.items():
+        content = b"\n".join(_read(os.path.join(static_dir, source)) for source in sources)
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+        _write(os.path.join(dist_dir, filename), content)
+        if len(content) >= MIN_COMPRESS_BYTES:
+            # mtime=0 keeps the gzip output identical across builds
+            _write(os.path.join(dist_dir, filename + ".gz"), gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli:
+                _write(os.path.join(dist_dir, filename + ".br"), brotli.compress(content))
+        manifest[name] = filename
+
+    _write(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # glob skips dotfiles, i.e. the lock and other writers' temp files
+    keep = set(manifest.values())
+    cutoff = time.time() - KEEP_OLD_BUILDS_SECONDS
+    for path in glob.glob(os.path.join(dist_dir, "*")):
+        base = os.path.basename(path)
+        if base == MANIFEST_NAME or base.split(".gz")[0].split(".br")[0] in keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return manifest
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read().rstrip(b"\n") + b"\n"
+
+
+def _write(path, content):
+    """Write ``path`` atomically through a temp file unique to this writer."""
+    directory, base = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{base}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def is_stale(static_dir=STATIC_DIR, dist_dir=DIST_DIR, bundles=BUNDLES):
+    """True if the manifest is missing or older than any source file."""
+    try:
+        built_at = os.path.getmtime(os.path.join(dist_dir, MANIFEST_NAME))
+    except OSError:
+        return True
+    sources = {source for sources in bundles.values() for source in sources}
+    return any(os.path.getmtime(os.path.join(static_dir, source)) > built_at for source in sources)
+
+
+class AssetPipeline:
+    """Serves built bundles and exposes ``asset_url`` to templates."""
+
+    def __init__(self, static_dir=STATIC_DIR, dist_dir=DIST_DIR, url_prefix="/assets", auto_build=True):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir
+        self.url_prefix = url_prefix
+        self.auto_build = auto_build
+        self.manifest = {}
+
+    def load(self):
+        if self.auto_build and is_stale(self.static_dir, self.dist_dir):
+            with build_lock(self.dist_dir):
+                # Another worker may have built while this one waited
+                if is_stale(self.static_dir, self.dist_dir):
+                    self.manifest = _build(self.static_dir, self.dist_dir, BUNDLES)
+                    logger.info("Built %s asset bundles into %s", len(self.manifest), self.dist_dir)
+                    return
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST_NAME), "r") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Could not load asset manifest (run python assets.py build): %s", e)
+            self.manifest = {}
+
+    def url(self, name):
+        """URL of the current build of bundle ``name``."""
+        filename = self.manifest.get(name)
+        if filename is None:
+            raise KeyError(f"Unknown asset bundle: {name}")
+        return f"{self.url_prefix}/{filename}"
+
+    def init_app(self, app):
+        from flask import abort, request, send_from_directory
+
+        self.load()
+        app.jinja_env.globals["asset_url"] = self.url
+
+        @app.route(f"{self.url_prefix}/<path:filename>")
+        def asset(filename):
+            if filename not in self.manifest.values():
+                abort(404)
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            encoding, served = None, filename
+            for name, suffix in ENCODINGS:
+                if name in request.accept_encodings and os.path.exists(os.path.join(self.dist_dir, filename + suffix)):
+                    encoding, served = name, filename + suffix
+                    break
+
+            response = send_from_directory(self.dist_dir, served, mimetype=mimetype, max_age=31536000)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            response.vary.add("Accept-Encoding")
+            return response
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["build"]:
+        print("Usage: python assets.py build")
+        sys.exit(1)
+
+    manifest = build()
+    print(f"Built {len(manifest)} bundles into {DIST_DIR}" + ("" if brotli else " (install brotli for .br files)"))
@@ -1,97 +1,470 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, Response, make_response, render_template, request, jsonify, redirect, url_for, session, flash, stream_with_context
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
 import json
+import logging
 import os
-import hashlib
 from dotenv import load_dotenv
-from together import Together
 import textwrap
+import copy
+import uuid
+from functools import partial
+
+from asgi import ASGIApp
+from assets import AssetPipeline
+from bundles import DEFAULT_BUNDLE_PATH, BundleIndex
+from chat_memory import ConversationStore
+from compression import ResponseCompressor
+from course_catalog import DEFAULT_CATALOG_PATH, CourseCatalog
+from chat_format import ChatResponseFormatter, format_chatbot_response, sse_event
+from generation import PlanFallbackError, agenerate_plan, fallback_scope, generate_plan, note_fallback
+from jobs import Job, JobQueue, QueueFullError
+from singleflight import AsyncSingleFlight, SingleFlight
+from llm_cache import create_cache_from_env
+from llm_client import create_llm_client_from_env
+from log_pipeline import create_transcript_logger_from_env, dropped_log_records, setup_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, AppMetrics
+from page_cache import PageCache, template_fingerprint
+from planner import plan_schedule
+from profile_keys import adopt_legacy_record, create_normalizer_from_env, legacy_user_id
+from semantic_cache import SemanticCache
+from session_store import create_session_interface_from_env
+from prompt_budget import UsageTracker, fit_field, usage_scope
+from storage import RecordIndex, create_storage_from_env
 
 load_dotenv()
 
+# Log records are queued and written by a background thread (LOG_LEVEL, LOG_FORMAT)
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Sampled prompt/response transcripts, written as rotating JSONL off the request path
+transcripts = create_transcript_logger_from_env()
+
 app = Flask(__name__)
 app.secret_key = "ai_mentor_hub_secret_key_2025"
 
+# Session data is kept server-side (SESSION_BACKEND=sqlite or memory) and the
+# cookie only carries a random session ID; SESSION_BACKEND=cookie keeps
+# Flask's signed cookie sessions
+session_interface = create_session_interface_from_env()
+if session_interface is not None:
+    app.session_interface = session_interface
+
+# Route, template, LLM and storage timings, served on /metrics
+metrics = AppMetrics()
+metrics.init_app(app)
+
+# Estimated token usage per call site, route and user_id (on /stats and /metrics)
+usage = UsageTracker(on_record=metrics.record_tokens)
+usage.init_app(app)
+
+# Fingerprinted, precompressed CSS/JS bundles on /assets/ (built on startup when
+# stale unless ASSETS_AUTO_BUILD=false, e.g. after `python assets.py build`)
+assets = AssetPipeline(auto_build=os.getenv("ASSETS_AUTO_BUILD", "true").lower() == "true")
+assets.init_app(app)
+
+# Pages that render without any context, pre-rendered on startup and served
+# with an ETag/Last-Modified for 304 revalidation (PAGE_CACHE=false disables)
+pages = PageCache(
+    [
+        "landing.html", "login.html", "dashboard_selection.html", "study_dashboard.html", "career_dashboard.html",
+        "ai_skills_analysis.html", "personalized_learning_paths.html", "structured_timeline.html",
+        "career_guidance.html", "quality_curation.html", "project_recommendations.html",
+    ],
+    enabled=os.getenv("PAGE_CACHE", "true").lower() == "true",
+)
+pages.init_app(app)
+
+# gzip/brotli for dynamic responses of at least COMPRESS_MIN_SIZE bytes
+# (COMPRESSION=false disables it, e.g. behind a compressing proxy)
+compressor = ResponseCompressor(
+    min_size=int(os.getenv("COMPRESS_MIN_SIZE", "500")),
+    level=int(os.getenv("COMPRESS_LEVEL", "6")),
+    enabled=os.getenv("COMPRESSION", "true").lower() == "true",
+)
+compressor.init_app(app)
+
+# Part of the stored recommendations page's ETag, so cached copies are
+# revalidated after a deploy that changes the templates or asset bundles
+page_version = template_fingerprint(app, assets.manifest)
+
+# ASGI entry point (uvicorn bot:asgi_app): /chat, /chat/stream,
+# /recommendations and /check-recommendations run as coroutines that await the
+# LLM (or a queued prefetch) without holding a thread; other routes run on
+# ASGI_THREADS threads
+asgi_app = ASGIApp(app, max_threads=int(os.getenv("ASGI_THREADS", "32")))
+
 # Load Together AI API key
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
-client = Together(api_key=TOGETHER_API_KEY) if TOGETHER_API_KEY else None
+client = create_llm_client_from_env(TOGETHER_API_KEY)
+
+# How recommendations and the schedule are generated: "pipelined" (both prompts
+# at once), "sequential" (one after the other) or "combined" (a single prompt)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "pipelined")
+
+# "llm" asks the AI for recommendations; "catalog" ranks the local course
+# catalog instead, with no AI call (always used as the fallback too)
+RECOMMENDATION_ENGINE = os.getenv("RECOMMENDATION_ENGINE", "llm")
+catalog = CourseCatalog.load(os.getenv("COURSE_CATALOG_PATH", DEFAULT_CATALOG_PATH))
+
+# "llm" asks the model for the schedule; "local" packs the recommendations into
+# a weekly time budget without an AI call (always used as the fallback too)
+SCHEDULE_PLANNER = os.getenv("SCHEDULE_PLANNER", "llm")
+PLANNER_WEEKLY_HOURS = float(os.getenv("PLANNER_WEEKLY_HOURS", "3"))
+
+# Shared LLM response cache (None when LLM_CACHE_BACKEND=none)
+llm_cache = create_cache_from_env()
+
+# Where generated recommendations are stored (STORAGE_BACKEND=sqlite or json)
+storage = create_storage_from_env()
+
+# Precomputed plans for common profiles (python bundles.py build); a new profile
+# is served from the nearest bundle when their similarity clears BUNDLE_THRESHOLD
+bundles = BundleIndex.load(
+    os.getenv("BUNDLES_PATH", DEFAULT_BUNDLE_PATH),
+    threshold=float(os.getenv("BUNDLE_THRESHOLD", "0.85")),
+)
+
+# Canonicalizes the name, background and goal before they're hashed into a
+# user ID, so trivially different spellings share stored recommendations
+profile_normalizer = create_normalizer_from_env()
+
+# user_id -> timestamps of the stored record, for cheap existence checks
+recommendation_index = RecordIndex()
+recommendation_index.build(storage)
+
+# Background workers for job-mode (async=true) recommendation generation and
+# prefetches; JOB_WORKERS caps how many of those run at once (the rest wait in
+# the queue, up to JOB_MAX_PENDING). ASGI /recommendations requests generate
+# on the event loop instead and aren't limited by it
+job_queue = JobQueue(
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+)
+
+# Start generating in the background when /check-recommendations misses, so the
+# result is ready (or nearly) by the time the form is submitted
+PREFETCH_ON_CHECK = os.getenv("PREFETCH_ON_CHECK", "false").lower() == "true"
+
+# Longest a request waits for a queued/running job before generating itself
+JOB_JOIN_TIMEOUT = float(os.getenv("JOB_JOIN_TIMEOUT", "120"))
+
+# Concurrent generations for the same user and intent share one call: threads
+# (the WSGI routes and job workers) through generation_flight, ASGI requests
+# on the event loop through generation_aflight
+generation_flight = SingleFlight()
+generation_aflight = AsyncSingleFlight()
+
+# Also serialize generations across worker processes through a storage lock
+GENERATION_PROCESS_LOCK = os.getenv("GENERATION_PROCESS_LOCK", "true").lower() == "true"
+
+# Stored recommendations older than the soft TTL are still served, but a
+# background refresh is queued; only the hard TTL forces a regeneration
+RECOMMENDATIONS_SOFT_TTL = timedelta(days=float(os.getenv("RECOMMENDATIONS_SOFT_TTL_DAYS", "30")))
+RECOMMENDATIONS_HARD_TTL = timedelta(days=float(os.getenv("RECOMMENDATIONS_HARD_TTL_DAYS", "180")))
+
+# Most tokens the model may generate, per call site
+MAX_TOKENS = {
+    "recommendations": 1200,
+    "schedule": 700,
+    "plan": 1800,
+    "chat": 400,
+    "chat_summary": 300,
+}
+
+# Seconds a cached LLM response stays valid, per call site
+CACHE_TTL = {
+    "recommendations": 7 * 24 * 3600,
+    "schedule": 7 * 24 * 3600,
+    "plan": 7 * 24 * 3600,
+    "chat": 24 * 3600,
+}
+
+# Answers to first chat questions, reused for paraphrases whose similarity
+# clears SEMANTIC_CACHE_THRESHOLD (SEMANTIC_CACHE=false disables it)
+faq_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "500")),
+    ttl=CACHE_TTL["chat"],
+) if os.getenv("SEMANTIC_CACHE", "true").lower() == "true" else None
+
+LLM_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct-Lite"
+
+CHAT_CONTEXT = """You are an AI Learning Mentor for the AI Mentor Hub. 
+    This app helps students and career-switchers by:
+    - Analyzing their skills and background
+    - Creating personalized learning paths
+    - Recommending quality online courses
+    - Building structured study schedules
+    - Providing career guidance
+    
+    Answer questions about learning, courses, career advice, and study planning.
+    Be encouraging, practical, and specific.
+    
+    Instructions:
+    - Keep responses concise (3-4 lines max)
+    - Use bullet points when helpful
+    - Focus on actionable advice
+    """
+
+# prompt_llm and prompt_llm_stream report failures as text starting with one of these
+LLM_ERROR_PREFIXES = ("AI service not available", "Error generating response:")
+
+def prompt_llm(prompt, with_linebreak=False, cache_ttl=None, use_cache=True, call_site="other"):
+    """Function to prompt the LLM via Together API
+    
+    Successful responses are cached for cache_ttl seconds; use_cache=False
+    skips the cache lookup but still stores the fresh response. call_site
+    labels the call in /metrics.
+    """
+    with metrics.llm_call(call_site) as outcome:
+        output = None
+        if llm_cache and cache_ttl and use_cache:
+            output = llm_cache.get(LLM_MODEL, prompt)
+            if output is not None:
+                outcome["value"] = "cache_hit"
+        
+        if output is None and not client:
+            outcome["value"] = "error"
+            return "AI service not available. Please check your API configuration."
+        
+        try:
+            if output is None:
+                output = client.complete(prompt, LLM_MODEL, max_tokens=MAX_TOKENS.get(call_site))
+                usage.record(call_site, prompt, output)
+                if llm_cache and cache_ttl:
+                    llm_cache.set(LLM_MODEL, prompt, output, cache_ttl)
+            transcripts.log(call_site, prompt, output, cached=outcome["value"] == "cache_hit")
+            
+            if with_linebreak:
+                wrapped_output = textwrap.fill(output, width=50)
+                return wrapped_output
+            else:
+                return output
+        except Exception as e:
+            outcome["value"] = "error"
+            return f"Error generating response: {str(e)}"
 
-def prompt_llm(prompt, with_linebreak=False):
-    """Function to prompt the LLM via Together API"""
+def prompt_llm_stream(prompt, outcome=None):
+    """Yield the LLM completion token by token as it is generated
+    
+    Failures are yielded as text, as in prompt_llm, possibly after part of
+    the reply; outcome["value"] is then set to "error" so the caller can tell.
+    """
+    if outcome is None:
+        outcome = {}
     if not client:
-        return "AI service not available. Please check your API configuration."
+        outcome["value"] = "error"
+        yield "AI service not available. Please check your API configuration."
+        return
     
-    model = "meta-llama/Meta-Llama-3-8B-Instruct-Lite"
+    try:
+        yield from client.stream(prompt, LLM_MODEL, max_tokens=MAX_TOKENS["chat"])
+    except Exception as e:
+        outcome["value"] = "error"
+        yield f"Error generating response: {str(e)}"
+
+async def aprompt_llm_stream(prompt, outcome=None):
+    """Like prompt_llm_stream, for the ASGI routes: each token is awaited on the event loop"""
+    if outcome is None:
+        outcome = {}
+    if not client:
+        outcome["value"] = "error"
+        yield "AI service not available. Please check your API configuration."
+        return
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        output = response.choices[0].message.content
+        async for token in client.astream(prompt, LLM_MODEL, max_tokens=MAX_TOKENS["chat"]):
+            yield token
+    except Exception as e:
+        outcome["value"] = "error"
+        yield f"Error generating response: {str(e)}"
+
+async def aprompt_llm(prompt, cache_ttl=None, use_cache=True, call_site="other"):
+    """Like prompt_llm, for the ASGI routes: the LLM call is awaited without holding a thread, and the response cache (possibly SQLite) is read and written on one"""
+    with metrics.llm_call(call_site) as outcome:
+        output = None
+        if llm_cache and cache_ttl and use_cache:
+            output = await asyncio.to_thread(llm_cache.get, LLM_MODEL, prompt)
+            if output is not None:
+                outcome["value"] = "cache_hit"
         
-        if with_linebreak:
-            wrapped_output = textwrap.fill(output, width=50)
-            return wrapped_output
-        else:
+        if output is None and not client:
+            outcome["value"] = "error"
+            return "AI service not available. Please check your API configuration."
+        
+        try:
+            if output is None:
+                output = await client.acomplete(prompt, LLM_MODEL, max_tokens=MAX_TOKENS.get(call_site))
+                usage.record(call_site, prompt, output)
+                if llm_cache and cache_ttl:
+                    await asyncio.to_thread(llm_cache.set, LLM_MODEL, prompt, output, cache_ttl)
+            transcripts.log(call_site, prompt, output, cached=outcome["value"] == "cache_hit")
             return output
-    except Exception as e:
-        return f"Error generating response: {str(e)}"
+        except Exception as e:
+            outcome["value"] = "error"
+            return f"Error generating response: {str(e)}"
+
+def discard_cached_response(prompt):
+    """Drop a cached completion that couldn't be parsed, so the next request asks the LLM again."""
+    if llm_cache:
+        llm_cache.delete(LLM_MODEL, prompt)
 
 def generate_user_id(name, background, goal):
-    """Generate a unique user ID based on user information."""
-    user_string = f"{name.lower()}_{background.lower()}_{goal.lower()}"
-    return hashlib.md5(user_string.encode()).hexdigest()[:12]
+    """Generate a unique user ID based on the canonical form of the user information."""
+    return profile_normalizer.user_id(name, background, goal)
 
-def save_user_recommendations(user_id, recommendations, schedule):
-    """Save user recommendations to a JSON file."""
+def save_user_recommendations(user_id, recommendations, schedule, profile=None):
+    """Save user recommendations (and the profile they were made for) to the configured storage backend."""
     try:
-        os.makedirs('user_data', exist_ok=True)
-        
-        user_data = {
-            'user_id': user_id,
-            'recommendations': recommendations,
-            'schedule': schedule,
-            'created_at': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        file_path = f'user_data/{user_id}.json'
-        with open(file_path, 'w') as f:
-            json.dump(user_data, f, indent=2)
-        
-        print(f"Saved recommendations for user: {user_id}")
+        with metrics.storage_seconds.time(operation="save"):
+            record = storage.save(user_id, recommendations, schedule, profile)
+        recommendation_index.update(record)
+        logger.info("Saved recommendations for user: %s", user_id)
         return True
     except Exception as e:
-        print(f"Error saving user recommendations: {e}")
+        logger.error("Error saving user recommendations: %s", e)
         return False
 
-def load_user_recommendations(user_id):
-    """Load user recommendations from JSON file."""
+def count_profile_lookup(user, record, adopted=False):
+    """Count a lookup of stored recommendations, noting hits only the canonical user ID finds."""
+    if adopted:
+        metrics.profile_lookups.inc(outcome="legacy_hit")
+        return
+    outcome = "hit" if record else "miss"
+    profile = (record or {}).get("profile") or {}
+    if "name" in profile:
+        stored_id = legacy_user_id(profile["name"], profile.get("background", ""), profile.get("goal", ""))
+        if stored_id != legacy_user_id(user["name"], user["background"], user["goal"]):
+            outcome = "normalized_hit"
+    metrics.profile_lookups.inc(outcome=outcome)
+
+
+def load_user_recommendations(user_id, user=None):
+    """Load user recommendations from the configured storage backend.
+
+    Recommendations past the soft TTL are returned as they are; if ``user``
+    is given, a background refresh is queued for them.
+    """
     try:
-        file_path = f'user_data/{user_id}.json'
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                user_data = json.load(f)
-            
-            # Check if data is not too old (optional: 30 days)
-            created_at = datetime.fromisoformat(user_data['created_at'])
-            if datetime.now() - created_at < timedelta(days=30):
-                print(f"Loaded existing recommendations for user: {user_id}")
-                return user_data['recommendations'], user_data['schedule']
-            else:
-                print(f"Recommendations too old for user: {user_id}")
-                return None, None
-        else:
-            print(f"No existing recommendations found for user: {user_id}")
+        with metrics.storage_seconds.time(operation="load"):
+            user_data = storage.load(user_id)
+        adopted = None
+        if user_data is None and user is not None:
+            # Saved under an earlier key version's ID: move it over
+            adopted = user_data = adopt_legacy_record(storage, user_id, user, profile_normalizer)
+            if adopted is not None:
+                for old_id in profile_normalizer.previous_user_ids(user["name"], user["background"], user["goal"]):
+                    recommendation_index.remove(old_id)
+                logger.info("Moved legacy recommendations to user: %s", user_id)
+        if user is not None:
+            count_profile_lookup(user, user_data, adopted is not None)
+        if user_data is None:
+            logger.info("No existing recommendations found for user: %s", user_id)
+            return None, None
+        recommendation_index.update(user_data)
+        
+        age = datetime.now() - datetime.fromisoformat(user_data['created_at'])
+        if age >= RECOMMENDATIONS_HARD_TTL:
+            logger.info("Recommendations too old for user: %s", user_id)
             return None, None
+        
+        if age >= RECOMMENDATIONS_SOFT_TTL:
+            logger.info("Serving stale recommendations for user: %s", user_id)
+            if user is not None:
+                start_refresh(user, user_id)
+        else:
+            logger.info("Loaded existing recommendations for user: %s", user_id)
+        return user_data['recommendations'], user_data['schedule']
     except Exception as e:
-        print(f"Error loading user recommendations: {e}")
+        logger.error("Error loading user recommendations: %s", e)
         return None, None
 
-def get_recommendations(background, goal):
+# Static content used whenever the AI is unavailable or its output can't be parsed
+FALLBACK_RECOMMENDATIONS = [
+    {
+        "title": "Introduction to Programming",
+        "url": "https://www.codecademy.com/learn/introduction-to-programming",
+        "platform": "Codecademy",
+        "duration": "20 hours",
+        "level": "Beginner",
+        "rating": "4.5+",
+        "desc": "Learn programming fundamentals and basic concepts",
+        "why": "Build essential programming skills for your career"
+    },
+    {
+        "title": "Web Development Basics",
+        "url": "https://www.freecodecamp.org/",
+        "platform": "freeCodeCamp",
+        "duration": "Self-paced",
+        "level": "Beginner",
+        "rating": "4.8",
+        "desc": "HTML, CSS, and JavaScript fundamentals",
+        "why": "Create interactive web applications"
+    }
+]
+
+FALLBACK_SCHEDULE = [
+    {"week": 1, "items": ["Complete programming basics", "Practice coding exercises"], "completed": False, "progress": 0},
+    {"week": 2, "items": ["Learn HTML and CSS", "Build first webpage"], "completed": False, "progress": 0},
+    {"week": 3, "items": ["Study JavaScript fundamentals", "Create interactive elements"], "completed": False, "progress": 0},
+    {"week": 4, "items": ["Build a complete project", "Deploy your work"], "completed": False, "progress": 0},
+    {"week": 5, "items": ["Learn advanced concepts", "Work on portfolio"], "completed": False, "progress": 0},
+    {"week": 6, "items": ["Final project completion", "Prepare for next phase"], "completed": False, "progress": 0}
+]
+
+def fallback_reason(response):
+    """The llm_fallbacks reason for a response that gave no usable result"""
+    if response is None or response.startswith(LLM_ERROR_PREFIXES):
+        return "error"
+    return "parse_failure"
+
+def record_fallback(call_site, reason):
+    """Count a fallback in /metrics and note it for a strict generation (see generate_user_plan)."""
+    metrics.llm_fallbacks.inc(call_site=call_site, reason=reason)
+    note_fallback(call_site)
+
+def fallback_recommendations(background="", goal=""):
+    """Rank the course catalog for the user, or return the static recommendations."""
+    return catalog.recommend(background, goal) or copy.deepcopy(FALLBACK_RECOMMENDATIONS)
+
+def get_recommendations(background, goal, use_cache=True):
     """Generate personalized course recommendations using AI."""
-    prompt = f"""
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    if RECOMMENDATION_ENGINE == "catalog":
+        return fallback_recommendations(background, goal)
+    
+    prompt = recommendations_prompt(background, goal)
+    response = None
+    try:
+        response = prompt_llm(
+            prompt, cache_ttl=CACHE_TTL["recommendations"], use_cache=use_cache, call_site="recommendations"
+        )
+    except Exception as e:
+        logger.error("Error parsing AI response: %s", e)
+    return recommendations_from_response(response, prompt, background, goal)
+
+async def aget_recommendations(background, goal, use_cache=True):
+    """Like get_recommendations, for the ASGI routes: the AI call is awaited, parsing runs on a thread"""
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    if RECOMMENDATION_ENGINE == "catalog":
+        return await asyncio.to_thread(fallback_recommendations, background, goal)
+    
+    prompt = recommendations_prompt(background, goal)
+    response = None
+    try:
+        response = await aprompt_llm(
+            prompt, cache_ttl=CACHE_TTL["recommendations"], use_cache=use_cache, call_site="recommendations"
+        )
+    except Exception as e:
+        logger.error("Error parsing AI response: %s", e)
+    return await asyncio.to_thread(recommendations_from_response, response, prompt, background, goal)
+
+def recommendations_prompt(background, goal):
+    """The recommendations prompt for an already fitted background and goal"""
+    return f"""
     Based on the user's background: "{background}" and goal: "{goal}", 
     recommend 6 high-quality online courses/resources that would help them achieve their goal.
     
@@ -107,45 +480,57 @@ def get_recommendations(background, goal):
     
     Format as JSON array with these exact field names.
     """
+
+def recommendations_from_response(response, prompt, background, goal):
+    """Parse the recommendations JSON, falling back to the catalog if there is none"""
+    if response is not None:
+        try:
+            # Try to parse JSON response
+            import re
+            json_match = re.search(r'\[.*\]', response, re.DOTALL)
+            if json_match:
+                recommendations = json.loads(json_match.group())
+                return recommendations
+        except Exception as e:
+            logger.error("Error parsing AI response: %s", e)
+    
+    # Fallback recommendations
+    discard_cached_response(prompt)
+    record_fallback(call_site="recommendations", reason=fallback_reason(response))
+    return fallback_recommendations(background, goal)
+
+def build_schedule(background, goal, recommendations, use_cache=True):
+    """Generate a 6-week learning schedule based on recommendations."""
+    # The local planner needs the recommendations; without them use the AI
+    if SCHEDULE_PLANNER == "local" and recommendations:
+        return plan_schedule(recommendations, PLANNER_WEEKLY_HOURS)
     
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    prompt = schedule_prompt(background, goal, recommendations)
+    response = None
     try:
-        response = prompt_llm(prompt)
-        # Try to parse JSON response
-        import re
-        json_match = re.search(r'\[.*\]', response, re.DOTALL)
-        if json_match:
-            recommendations = json.loads(json_match.group())
-            return recommendations
+        response = prompt_llm(prompt, cache_ttl=CACHE_TTL["schedule"], use_cache=use_cache, call_site="schedule")
     except Exception as e:
-        print(f"Error parsing AI response: {e}")
+        logger.error("Error parsing schedule response: %s", e)
+    return schedule_from_response(response, prompt, recommendations)
+
+async def abuild_schedule(background, goal, recommendations, use_cache=True):
+    """Like build_schedule, for the ASGI routes: the AI call is awaited, planning and parsing run on a thread"""
+    if SCHEDULE_PLANNER == "local" and recommendations:
+        return await asyncio.to_thread(plan_schedule, recommendations, PLANNER_WEEKLY_HOURS)
     
-    # Fallback recommendations
-    return [
-        {
-            "title": "Introduction to Programming",
-            "url": "https://www.codecademy.com/learn/introduction-to-programming",
-            "platform": "Codecademy",
-            "duration": "20 hours",
-            "level": "Beginner",
-            "rating": "4.5+",
-            "desc": "Learn programming fundamentals and basic concepts",
-            "why": "Build essential programming skills for your career"
-        },
-        {
-            "title": "Web Development Basics",
-            "url": "https://www.freecodecamp.org/",
-            "platform": "freeCodeCamp",
-            "duration": "Self-paced",
-            "level": "Beginner",
-            "rating": "4.8",
-            "desc": "HTML, CSS, and JavaScript fundamentals",
-            "why": "Create interactive web applications"
-        }
-    ]
-
-def build_schedule(background, goal, recommendations):
-    """Generate a 6-week learning schedule based on recommendations."""
-    prompt = f"""
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    prompt = schedule_prompt(background, goal, recommendations)
+    response = None
+    try:
+        response = await aprompt_llm(prompt, cache_ttl=CACHE_TTL["schedule"], use_cache=use_cache, call_site="schedule")
+    except Exception as e:
+        logger.error("Error parsing schedule response: %s", e)
+    return await asyncio.to_thread(schedule_from_response, response, prompt, recommendations)
+
+def schedule_prompt(background, goal, recommendations):
+    """The schedule prompt for an already fitted background and goal"""
+    return f"""
     Create a realistic 6-week learning schedule for someone with background: "{background}" 
     trying to achieve goal: "{goal}".
     
@@ -159,31 +544,108 @@ def build_schedule(background, goal, recommendations):
     
     Make tasks specific and actionable. Format as JSON array.
     """
+
+def schedule_from_response(response, prompt, recommendations):
+    """Parse the schedule JSON, falling back to a locally planned schedule if there is none"""
+    if response is not None:
+        try:
+            import re
+            json_match = re.search(r'\[.*\]', response, re.DOTALL)
+            if json_match:
+                schedule = json.loads(json_match.group())
+                return schedule
+        except Exception as e:
+            logger.error("Error parsing schedule response: %s", e)
+    
+    # Fallback schedule, planned locally when the recommendations are known
+    discard_cached_response(prompt)
+    record_fallback(call_site="schedule", reason=fallback_reason(response))
+    return plan_schedule(recommendations, PLANNER_WEEKLY_HOURS) or copy.deepcopy(FALLBACK_SCHEDULE)
+
+def get_plan(background, goal, use_cache=True):
+    """Generate recommendations and a 6-week schedule with a single AI call.
     
+    Each section is validated separately and falls back on its own.
+    """
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    prompt = plan_prompt(background, goal)
+    response = None
     try:
-        response = prompt_llm(prompt)
-        import re
-        json_match = re.search(r'\[.*\]', response, re.DOTALL)
-        if json_match:
-            schedule = json.loads(json_match.group())
-            return schedule
+        response = prompt_llm(prompt, cache_ttl=CACHE_TTL["plan"], use_cache=use_cache, call_site="plan")
     except Exception as e:
-        print(f"Error parsing schedule response: {e}")
-    
-    # Fallback schedule
-    return [
-        {"week": 1, "items": ["Complete programming basics", "Practice coding exercises"], "completed": False, "progress": 0},
-        {"week": 2, "items": ["Learn HTML and CSS", "Build first webpage"], "completed": False, "progress": 0},
-        {"week": 3, "items": ["Study JavaScript fundamentals", "Create interactive elements"], "completed": False, "progress": 0},
-        {"week": 4, "items": ["Build a complete project", "Deploy your work"], "completed": False, "progress": 0},
-        {"week": 5, "items": ["Learn advanced concepts", "Work on portfolio"], "completed": False, "progress": 0},
-        {"week": 6, "items": ["Final project completion", "Prepare for next phase"], "completed": False, "progress": 0}
-    ]
+        logger.error("Error parsing plan response: %s", e)
+    return plan_from_response(response, prompt, background, goal)
+
+async def aget_plan(background, goal, use_cache=True):
+    """Like get_plan, for the ASGI routes: the AI call is awaited, parsing runs on a thread"""
+    background, goal = fit_field(background, "background"), fit_field(goal, "goal")
+    prompt = plan_prompt(background, goal)
+    response = None
+    try:
+        response = await aprompt_llm(prompt, cache_ttl=CACHE_TTL["plan"], use_cache=use_cache, call_site="plan")
+    except Exception as e:
+        logger.error("Error parsing plan response: %s", e)
+    return await asyncio.to_thread(plan_from_response, response, prompt, background, goal)
+
+def plan_prompt(background, goal):
+    """The combined plan prompt for an already fitted background and goal"""
+    return f"""
+    Based on the user's background: "{background}" and goal: "{goal}", 
+    create a learning plan as one JSON object with exactly two keys:
+    
+    "recommendations": an array of 6 high-quality online courses/resources that would help them achieve their goal.
+    Each item has these exact field names:
+    - title: Course/resource name
+    - url: Link to the resource
+    - platform: Where it's hosted (Coursera, Udemy, YouTube, etc.)
+    - duration: How long it takes
+    - level: Beginner/Intermediate/Advanced
+    - rating: Quality rating (4.0+ format)
+    - desc: 1-2 sentence description
+    - why: Why this helps their goal
+    
+    "schedule": an array of 6 weeks built around those courses. Each item has:
+    - week: Week number (1-6)
+    - items: List of 3-4 specific, actionable tasks/activities
+    - completed: false
+    - progress: 0
+    
+    Respond with the JSON object only.
+    """
+
+def plan_from_response(response, prompt, background, goal):
+    """Parse the plan JSON object, falling back for each section that is missing or malformed"""
+    recommendations = None
+    schedule = None
+    if response is not None:
+        try:
+            import re
+            json_match = re.search(r'\{.*\}', response, re.DOTALL)
+            if json_match:
+                plan = json.loads(json_match.group())
+                recommendations = plan.get("recommendations")
+                schedule = plan.get("schedule")
+        except Exception as e:
+            logger.error("Error parsing plan response: %s", e)
+    
+    # Fall back per section (the schedule can be planned from the recommendations)
+    recommendations_ok = isinstance(recommendations, list) and all(isinstance(rec, dict) for rec in recommendations) and recommendations
+    schedule_ok = isinstance(schedule, list) and all(isinstance(week, dict) for week in schedule) and schedule
+    if not (recommendations_ok and schedule_ok):
+        discard_cached_response(prompt)
+    if not recommendations_ok:
+        record_fallback(call_site="plan_recommendations", reason=fallback_reason(response))
+        recommendations = fallback_recommendations(background, goal)
+    if not schedule_ok:
+        record_fallback(call_site="plan_schedule", reason=fallback_reason(response))
+        schedule = plan_schedule(recommendations, PLANNER_WEEKLY_HOURS) or copy.deepcopy(FALLBACK_SCHEDULE)
+    
+    return recommendations, schedule
 
 @app.route("/")
 def landing():
     """Landing page"""
-    return render_template("landing.html")
+    return pages.response("landing.html")
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -193,28 +655,28 @@ def login():
         session['logged_in'] = True
         session['user_name'] = request.form.get('email', 'User')
         return redirect(url_for('dashboard_selection'))
-    return render_template("login.html")
+    return pages.response("login.html")
 
 @app.route("/dashboard-selection")
 def dashboard_selection():
     """Dashboard selection page"""
     if not session.get('logged_in'):
         return redirect(url_for('login'))
-    return render_template("dashboard_selection.html")
+    return pages.response("dashboard_selection.html")
 
 @app.route("/study-dashboard")
 def study_dashboard():
     """Study preparations dashboard"""
     if not session.get('logged_in'):
         return redirect(url_for('login'))
-    return render_template("study_dashboard.html")
+    return pages.response("study_dashboard.html")
 
 @app.route("/career-dashboard")
 def career_dashboard():
     """Career guidance dashboard"""
     if not session.get('logged_in'):
         return redirect(url_for('login'))
-    return render_template("career_dashboard.html")
+    return pages.response("career_dashboard.html")
 
 @app.route("/check-recommendations", methods=["POST"])
 def check_recommendations():
@@ -226,158 +688,675 @@ def check_recommendations():
     }
     
     user_id = generate_user_id(user["name"], user["background"], user["goal"])
-    recommendations, schedule = load_user_recommendations(user_id)
     
-    if recommendations:
+    # Fresh entries are answered from the index alone. Unknown users (another
+    # worker may have saved since startup) and stale records, which may need a
+    # refresh, go to storage.
+    entry = recommendation_index.get(user_id)
+    if entry and datetime.now() - datetime.fromisoformat(entry[0]) < RECOMMENDATIONS_SOFT_TTL:
+        has_recommendations = True
+    else:
+        recommendations, schedule = load_user_recommendations(user_id, user)
+        has_recommendations = recommendations is not None
+    
+    if has_recommendations:
         return {"has_recommendations": True, "message": "You have existing recommendations. Click 'Generate Recommendations' to view them, or 'Regenerate' to create new ones."}
+    
+    if PREFETCH_ON_CHECK and all(user.values()) and start_prefetch(user, user_id):
+        return {"has_recommendations": False, "prefetching": True, "message": "No existing recommendations found. We've started preparing your personalized learning path - click 'Generate Recommendations' when you're ready."}
+    
+    return {"has_recommendations": False, "message": "No existing recommendations found. Click 'Generate Recommendations' to create your personalized learning path."}
+
+@asgi_app.route("/check-recommendations", methods=["POST"])
+async def check_recommendations_async():
+    """/check-recommendations under ASGI; it never waits on the LLM, and its storage lookups run on a thread."""
+    return await asyncio.to_thread(check_recommendations)
+
+def generate_user_plan(background, goal, use_cache=True, strict=False):
+    """Return (recommendations, schedule) from the generation pipeline, without saving.
+
+    With ``strict``, raises PlanFallbackError instead of returning a plan
+    that contains any fallback content (used when building bundles).
+    """
+    if strict:
+        with fallback_scope() as fallbacks:
+            plan = generate_user_plan(background, goal, use_cache)
+        if fallbacks:
+            raise PlanFallbackError(f"Fell back in: {', '.join(sorted(set(fallbacks)))}")
+        return plan
+    return generate_plan(
+        background,
+        goal,
+        partial(get_recommendations, use_cache=use_cache),
+        partial(build_schedule, use_cache=use_cache),
+        # The local planner needs the recommendations first, and the
+        # catalog engine is instant, so there is nothing to overlap
+        mode="sequential" if SCHEDULE_PLANNER == "local" or RECOMMENDATION_ENGINE == "catalog" else GENERATION_MODE,
+        get_combined_plan=partial(get_plan, use_cache=use_cache),
+        fallback_schedule=FALLBACK_SCHEDULE,
+        plan_locally=partial(plan_schedule, weekly_hours=PLANNER_WEEKLY_HOURS),
+    )
+
+async def agenerate_user_plan(background, goal, use_cache=True):
+    """Like generate_user_plan (without ``strict``), with the prompts awaited through aprompt_llm"""
+    return await agenerate_plan(
+        background,
+        goal,
+        partial(aget_recommendations, use_cache=use_cache),
+        partial(abuild_schedule, use_cache=use_cache),
+        mode="sequential" if SCHEDULE_PLANNER == "local" or RECOMMENDATION_ENGINE == "catalog" else GENERATION_MODE,
+        get_combined_plan=partial(aget_plan, use_cache=use_cache),
+        fallback_schedule=FALLBACK_SCHEDULE,
+        plan_locally=partial(plan_schedule, weekly_hours=PLANNER_WEEKLY_HOURS),
+    )
+
+def generate_user_recommendations(user, user_id, regenerate=False):
+    """Generate, save and return (recommendations, schedule) for a user.
+
+    Profiles close to a precomputed bundle are served from it unless
+    regenerating. Falls back to catalog recommendations if generation fails.
+    """
+    logger.info("Generating new recommendations for user: %s", user_id)
+    profile = {"name": user["name"], "background": user["background"], "goal": user["goal"]}
+    match = None
+    if len(bundles) and not regenerate:
+        match = bundles.lookup(user["background"], user["goal"])
+        metrics.bundle_lookups.inc(outcome="hit" if match else "miss")
+    try:
+        if match:
+            bundle, score = match
+            logger.info("Serving bundle %r for user: %s (similarity %.2f)", bundle["goal"], user_id, score)
+            recommendations = copy.deepcopy(bundle["recommendations"])
+            schedule = copy.deepcopy(bundle["schedule"])
+        else:
+            # Regenerating must not be answered from the LLM response cache
+            with usage_scope(user_id=user_id):
+                recommendations, schedule = generate_user_plan(user["background"], user["goal"], use_cache=not regenerate)
+        
+        # Save the new recommendations
+        save_user_recommendations(user_id, recommendations, schedule, profile)
+        
+    except Exception as e:
+        logger.error("Error generating recommendations: %s", e)
+        record_fallback(call_site="generation", reason="error")
+        recommendations = fallback_recommendations(user["background"], user["goal"])
+        schedule = plan_schedule(recommendations, PLANNER_WEEKLY_HOURS) or copy.deepcopy(FALLBACK_SCHEDULE)
+    
+    return recommendations, schedule
+
+async def agenerate_user_recommendations(user, user_id, regenerate=False):
+    """Like generate_user_recommendations, for the ASGI routes.
+
+    The AI calls are awaited on the event loop; the bundle lookup, the
+    fallbacks and the save run on threads.
+    """
+    logger.info("Generating new recommendations for user: %s", user_id)
+    profile = {"name": user["name"], "background": user["background"], "goal": user["goal"]}
+    match = None
+    if len(bundles) and not regenerate:
+        match = await asyncio.to_thread(bundles.lookup, user["background"], user["goal"])
+        metrics.bundle_lookups.inc(outcome="hit" if match else "miss")
+    try:
+        if match:
+            bundle, score = match
+            logger.info("Serving bundle %r for user: %s (similarity %.2f)", bundle["goal"], user_id, score)
+            recommendations = copy.deepcopy(bundle["recommendations"])
+            schedule = copy.deepcopy(bundle["schedule"])
+        else:
+            with usage_scope(user_id=user_id):
+                recommendations, schedule = await agenerate_user_plan(user["background"], user["goal"], use_cache=not regenerate)
+        
+        await asyncio.to_thread(save_user_recommendations, user_id, recommendations, schedule, profile)
+        
+    except Exception as e:
+        logger.error("Error generating recommendations: %s", e)
+        record_fallback(call_site="generation", reason="error")
+        recommendations = await asyncio.to_thread(fallback_recommendations, user["background"], user["goal"])
+        schedule = await asyncio.to_thread(plan_schedule, recommendations, PLANNER_WEEKLY_HOURS) or copy.deepcopy(FALLBACK_SCHEDULE)
+    
+    return recommendations, schedule
+
+def generation_key(user_id, regenerate=False):
+    """Key identifying one user's generation request for coalescing."""
+    return f"{user_id}:{'regenerate' if regenerate else 'generate'}"
+
+def generation_lock_name(user_id, regenerate=False):
+    """Name of the storage lock serializing one user's generations across processes"""
+    return f"{'regenerate' if regenerate else 'generate'}-{user_id}"
+
+def locked_user_recommendations(user, user_id, regenerate=False):
+    """Generate while holding the user's storage lock.
+
+    A worker process that had to wait for the lock reuses the result that
+    the lock holder saved instead of generating it again. Regenerations take
+    their own lock, so one never reuses the result of a normal generation.
+    """
+    if not GENERATION_PROCESS_LOCK:
+        return generate_user_recommendations(user, user_id, regenerate)
+    
+    started_at = datetime.now().isoformat()
+    try:
+        with storage.lock(generation_lock_name(user_id, regenerate)) as waited:
+            if waited:
+                user_data = storage.load(user_id)
+                if user_data and user_data['last_updated'] >= started_at:
+                    logger.info("Reusing recommendations generated by another worker for user: %s", user_id)
+                    return user_data['recommendations'], user_data['schedule']
+            return generate_user_recommendations(user, user_id, regenerate)
+    except TimeoutError:
+        logger.warning("Timed out waiting for the generation lock for user: %s", user_id)
+        return generate_user_recommendations(user, user_id, regenerate)
+
+async def alocked_user_recommendations(user, user_id, regenerate=False):
+    """Like locked_user_recommendations, waiting for the storage lock without holding a thread"""
+    if not GENERATION_PROCESS_LOCK:
+        return await agenerate_user_recommendations(user, user_id, regenerate)
+    
+    started_at = datetime.now().isoformat()
+    try:
+        async with storage.alock(generation_lock_name(user_id, regenerate)) as waited:
+            if waited:
+                user_data = await asyncio.to_thread(storage.load, user_id)
+                if user_data and user_data['last_updated'] >= started_at:
+                    logger.info("Reusing recommendations generated by another worker for user: %s", user_id)
+                    return user_data['recommendations'], user_data['schedule']
+            return await agenerate_user_recommendations(user, user_id, regenerate)
+    except TimeoutError:
+        logger.warning("Timed out waiting for the generation lock for user: %s", user_id)
+        return await agenerate_user_recommendations(user, user_id, regenerate)
+
+def coalesced_user_recommendations(user, user_id, regenerate=False):
+    """Generate recommendations, sharing one in-flight generation per user and intent."""
+    return generation_flight.do(
+        generation_key(user_id, regenerate), locked_user_recommendations, user, user_id, regenerate
+    )
+
+async def acoalesced_user_recommendations(user, user_id, regenerate=False):
+    """Like coalesced_user_recommendations, for the ASGI routes: concurrent requests await one generation task"""
+    return await generation_aflight.do(
+        generation_key(user_id, regenerate), alocked_user_recommendations, user, user_id, regenerate
+    )
+
+def prefetch_user_recommendations(user, user_id):
+    """Background generation started by /check-recommendations on a miss."""
+    user_data = storage.load(user_id)
+    if user_data is not None:
+        return user_data['recommendations'], user_data['schedule']
+    return coalesced_user_recommendations(user, user_id)
+
+def start_prefetch(user, user_id):
+    """Queue a prefetch for the user unless one is already queued or running.
+
+    Returns True if a generation for the user is now in progress.
+    """
+    key = generation_key(user_id)
+    if job_queue.find(key) is not None:
+        return True
+    try:
+        job_queue.submit(prefetch_user_recommendations, user, user_id, key=key)
+    except QueueFullError:
+        return False
+    logger.info("Prefetching recommendations for user: %s", user_id)
+    return True
+
+def start_refresh(user, user_id):
+    """Queue a background regeneration of stale recommendations for the user."""
+    key = generation_key(user_id)
+    if job_queue.find(key) is not None:
+        return
+    try:
+        job_queue.submit(coalesced_user_recommendations, user, user_id, key=key)
+    except QueueFullError:
+        logger.warning("Job queue full, not refreshing recommendations for user: %s", user_id)
+        return
+    logger.info("Refreshing stale recommendations for user: %s", user_id)
+
+def enqueue_user_recommendations(user, user_id, regenerate=False):
+    """Queue generation for a user and return the job as a 202 JSON response."""
+    if not regenerate:
+        recommendations, schedule = load_user_recommendations(user_id, user)
+        if recommendations is not None:
+            return jsonify({"job_id": None, "status": "done"})
+    
+    key = generation_key(user_id, regenerate)
+    job = job_queue.find(key)
+    try:
+        if job is None:
+            job = job_queue.submit(coalesced_user_recommendations, user, user_id, regenerate, key=key)
+    except QueueFullError:
+        return jsonify({"error": "Too many recommendations are being generated right now. Please try again."}), 503
+    
+    # Catalog picks the page can show while the job runs
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("job_status", job_id=job.id),
+        "preview": catalog.recommend(user["background"], user["goal"]),
+    }), 202
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Expose request, template, LLM and storage metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route("/stats")
+def stats():
+    """Report the sizes and hit rates of the in-process caches and queues."""
+    return jsonify({
+        "recommendation_index": recommendation_index.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "jobs": job_queue.stats(),
+        "llm_usage": usage.stats(),
+        "chat_memory": chat_memory.stats() if chat_memory else None,
+        "faq_cache": faq_cache.stats() if faq_cache else None,
+        "bundles": bundles.stats(),
+        "course_catalog": {"courses": len(catalog), "engine": RECOMMENDATION_ENGINE},
+        "page_cache": pages.stats(),
+        "sessions": session_interface.stats() if session_interface else None,
+        "coalesced_generations": generation_flight.shared + generation_aflight.shared,
+        "dropped_records": {"log": dropped_log_records(), "transcripts": transcripts.dropped},
+    })
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Report the status of a queued recommendations job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+def remember_user(user_id, user):
+    """Store user info in the session for future reference."""
+    session['user_id'] = user_id
+    session['user_name'] = user["name"]
+    session['user_background'] = user["background"]
+    session['user_goal'] = user["goal"]
+
+def recommendations_etag(record, user):
+    """Strong ETag for the recommendations page of a stored record."""
+    key = json.dumps([record["user_id"], record.get("last_updated", record["created_at"]), user, page_version])
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def stored_recommendations():
+    """Render the session user's stored recommendations, or 304 if the browser's copy is current."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for("study_dashboard"))
+    user = {
+        "name": session.get('user_name', ""),
+        "background": session.get('user_background', ""),
+        "goal": session.get('user_goal', ""),
+    }
+    
+    with metrics.storage_seconds.time(operation="load"):
+        record = storage.load(user_id)
+    if record is None or datetime.now() - datetime.fromisoformat(record['created_at']) >= RECOMMENDATIONS_HARD_TTL:
+        return redirect(url_for("study_dashboard"))
+    
+    # The ETag only needs the record's timestamps, so a match skips rendering
+    etag = recommendations_etag(record, user)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
     else:
-        return {"has_recommendations": False, "message": "No existing recommendations found. Click 'Generate Recommendations' to create your personalized learning path."}
+        response = make_response(render_template(
+            "recommendations.html", user=user, recommendations=record['recommendations'], schedule=record['schedule']
+        ))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
-@app.route("/recommendations", methods=["POST"])
-def recommendations():
-    """Generate and display personalized learning recommendations."""
-    print("Recommendations route called!")
+def recommendations_form():
+    """Read the submitted profile: ``(user, user_id, regenerate)``."""
     user = {
         "name": request.form.get("name", "").strip(),
         "background": request.form.get("background", "").strip(),
         "goal": request.form.get("goal", "").strip(),
     }
-    print(f"User data: {user}")
+    logger.debug("User data: %s", user)
     
     # Generate unique user ID
     user_id = generate_user_id(user["name"], user["background"], user["goal"])
     
     # Check if user wants to regenerate (from regenerate button)
     regenerate = request.form.get("regenerate", "false").lower() == "true"
-    
-    # Try to load existing recommendations first (unless regenerating)
-    recommendations = None
-    schedule = None
-    
-    if not regenerate:
-        recommendations, schedule = load_user_recommendations(user_id)
-    
-    # Generate new recommendations if none exist or user requested regeneration
-    if recommendations is None or regenerate:
-        print(f"Generating new recommendations for user: {user_id}")
-        try:
-            recommendations = get_recommendations(user["background"], user["goal"])
-            schedule = build_schedule(user["background"], user["goal"], recommendations)
-            
-            # Save the new recommendations
-            save_user_recommendations(user_id, recommendations, schedule)
-            
-        except Exception as e:
-            print(f"Error generating recommendations: {e}")
-            # Fallback recommendations
-            recommendations = [
-                {
-                    "title": "Introduction to Programming",
-                    "url": "https://www.codecademy.com/learn/introduction-to-programming",
-                    "platform": "Codecademy",
-                    "duration": "20 hours",
-                    "level": "Beginner",
-                    "rating": "4.5+",
-                    "desc": "Learn programming fundamentals and basic concepts",
-                    "why": "Build essential programming skills for your career"
-                },
-                {
-                    "title": "Web Development Basics",
-                    "url": "https://www.freecodecamp.org/",
-                    "platform": "freeCodeCamp",
-                    "duration": "Self-paced",
-                    "level": "Beginner",
-                    "rating": "4.8",
-                    "desc": "HTML, CSS, and JavaScript fundamentals",
-                    "why": "Create interactive web applications"
-                }
-            ]
-            schedule = [
-                {"week": 1, "items": ["Complete programming basics", "Practice coding exercises"], "completed": False, "progress": 0},
-                {"week": 2, "items": ["Learn HTML and CSS", "Build first webpage"], "completed": False, "progress": 0},
-                {"week": 3, "items": ["Study JavaScript fundamentals", "Create interactive elements"], "completed": False, "progress": 0},
-                {"week": 4, "items": ["Build a complete project", "Deploy your work"], "completed": False, "progress": 0},
-                {"week": 5, "items": ["Learn advanced concepts", "Work on portfolio"], "completed": False, "progress": 0},
-                {"week": 6, "items": ["Final project completion", "Prepare for next phase"], "completed": False, "progress": 0}
-            ]
-    
+    return user, user_id, regenerate
+
+def redirect_to_stored(user, user_id):
+    """Redirect to GET /recommendations if the user has stored recommendations, else None."""
+    recommendations, schedule = load_user_recommendations(user_id, user)
+    if recommendations is None:
+        return None
+    # Stored plans are shown through GET, which the browser can revalidate
+    remember_user(user_id, user)
+    return redirect(url_for("recommendations"), code=303)
+
+def render_recommendations(user, user_id, recommendations, schedule):
+    """Render newly generated recommendations and remember the user in the session."""
     # Ensure they are lists
     if not isinstance(recommendations, list):
         recommendations = []
     if not isinstance(schedule, list):
         schedule = []
     
-    # Store user info in session for future reference
-    session['user_id'] = user_id
-    session['user_name'] = user["name"]
-    session['user_background'] = user["background"]
-    session['user_goal'] = user["goal"]
+    remember_user(user_id, user)
     
     return render_template("recommendations.html", user=user, recommendations=recommendations, schedule=schedule)
 
+@app.route("/recommendations", methods=["GET", "POST"])
+def recommendations():
+    """Generate and display personalized learning recommendations."""
+    if request.method == "GET":
+        return stored_recommendations()
+    
+    logger.debug("Recommendations route called")
+    user, user_id, regenerate = recommendations_form()
+    
+    # Job mode: queue the generation and let the page poll /jobs/<id>
+    if request.form.get("async", "false").lower() == "true":
+        return enqueue_user_recommendations(user, user_id, regenerate)
+    
+    # Try to load existing recommendations first (unless regenerating)
+    if not regenerate:
+        stored = redirect_to_stored(user, user_id)
+        if stored is not None:
+            return stored
+    
+    # Join a queued or running job (e.g. a prefetch) instead of starting over
+    job = job_queue.find(generation_key(user_id, regenerate))
+    if job is not None and job.wait(JOB_JOIN_TIMEOUT) and job.status == Job.DONE:
+        recommendations, schedule = job.result
+    else:
+        recommendations, schedule = coalesced_user_recommendations(user, user_id, regenerate)
+    
+    return render_recommendations(user, user_id, recommendations, schedule)
+
+@asgi_app.route("/recommendations", methods=["GET", "POST"])
+async def recommendations_async():
+    """/recommendations under ASGI: generation awaits the LLM on the event loop without holding a thread."""
+    # Storage and rendering run on threads, in this request's context, so
+    # the event loop never blocks on disk
+    if request.method == "GET":
+        return await asyncio.to_thread(stored_recommendations)
+    
+    logger.debug("Recommendations route called")
+    user, user_id, regenerate = recommendations_form()
+    
+    # Job mode: queue the generation and let the page poll /jobs/<id>
+    if request.form.get("async", "false").lower() == "true":
+        return await asyncio.to_thread(enqueue_user_recommendations, user, user_id, regenerate)
+    
+    if not regenerate:
+        stored = await asyncio.to_thread(redirect_to_stored, user, user_id)
+        if stored is not None:
+            return stored
+    
+    # Join a queued or running job (e.g. a prefetch) instead of starting over;
+    # otherwise both prompts are awaited at once, shared with concurrent
+    # requests for the same user
+    job = job_queue.find(generation_key(user_id, regenerate))
+    if job is not None and await job.wait_async(JOB_JOIN_TIMEOUT) and job.status == Job.DONE:
+        recommendations, schedule = job.result
+    else:
+        recommendations, schedule = await acoalesced_user_recommendations(user, user_id, regenerate)
+    
+    return await asyncio.to_thread(render_recommendations, user, user_id, recommendations, schedule)
+
 # Feature detail pages
 @app.route("/ai-skills-analysis")
 def ai_skills_analysis():
-    return render_template("ai_skills_analysis.html")
+    return pages.response("ai_skills_analysis.html")
 
 @app.route("/personalized-learning-paths")
 def personalized_learning_paths():
-    return render_template("personalized_learning_paths.html")
+    return pages.response("personalized_learning_paths.html")
 
 @app.route("/structured-timeline")
 def structured_timeline():
-    return render_template("structured_timeline.html")
+    return pages.response("structured_timeline.html")
 
 @app.route("/career-guidance")
 def career_guidance():
-    return render_template("career_guidance.html")
+    return pages.response("career_guidance.html")
 
 @app.route("/quality-curation")
 def quality_curation():
-    return render_template("quality_curation.html")
+    return pages.response("quality_curation.html")
 
 @app.route("/project-recommendations")
 def project_recommendations():
-    return render_template("project_recommendations.html")
+    return pages.response("project_recommendations.html")
+
+def summarize_conversation(summary, turns):
+    """Fold older chat turns into the conversation's rolling summary."""
+    transcript = "\n".join(f"{'User' if role == 'user' else 'Mentor'}: {text}" for role, text in turns)
+    prompt = f"""
+    Update the summary of a conversation between a learner and their AI learning mentor.
+    Keep the learner's background, goals, questions and the advice already given.
+    Write at most {CHAT_SUMMARY_TOKENS * 3 // 4} words of plain text.
+    
+    Current summary:
+    {summary or "(none)"}
+    
+    New messages:
+    {transcript}
+    """
+    response = prompt_llm(prompt, call_site="chat_summary")
+    if response.startswith(LLM_ERROR_PREFIXES):
+        raise RuntimeError(response)
+    return response
+
+# Per-session chat memory: recent turns up to CHAT_HISTORY_TOKENS, with older
+# turns folded into a rolling summary. CHAT_HISTORY_TOKENS=0 keeps chat stateless.
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+chat_memory = ConversationStore(
+    summarize=summarize_conversation,
+    history_tokens=CHAT_HISTORY_TOKENS,
+    summary_tokens=CHAT_SUMMARY_TOKENS,
+    idle_ttl=float(os.getenv("CHAT_IDLE_TTL", "1800")),
+    max_conversations=int(os.getenv("CHAT_MAX_CONVERSATIONS", "1000")),
+) if CHAT_HISTORY_TOKENS > 0 else None
+
+def chat_conversation_id():
+    """Return the ID of this browser session's chat conversation."""
+    if "chat_id" not in session:
+        session["chat_id"] = uuid.uuid4().hex
+    return session["chat_id"]
+
+def build_chat_prompt(conversation_id, user_message):
+    """Build the chat prompt, including the conversation's memory if enabled."""
+    if chat_memory is None:
+        return f"{CHAT_CONTEXT}\n\nUser question: {user_message}"
+    return chat_memory.build_prompt(conversation_id, CHAT_CONTEXT, user_message)
+
+def remember_chat(conversation_id, user_message, reply):
+    """Add a finished exchange to the conversation's memory."""
+    if chat_memory is not None:
+        chat_memory.add_exchange(conversation_id, user_message, reply)
+
+def use_faq_cache(conversation_id, data):
+    """Whether a chat message may be answered from (and stored in) the FAQ cache.
+
+    Only the first question of a conversation qualifies, since follow-ups
+    depend on the earlier turns. Clients can send ``"cache": false`` to skip it.
+    """
+    if faq_cache is None:
+        return False
+    if data.get("cache", True) is False or (chat_memory is not None and chat_memory.has_history(conversation_id)):
+        metrics.faq_cache_lookups.inc(outcome="bypass")
+        return False
+    return True
+
+def faq_lookup(user_message):
+    """Return the cached ``(answer, html, similarity)`` for a question, or None."""
+    hit = faq_cache.lookup(user_message)
+    metrics.faq_cache_lookups.inc(outcome="hit" if hit else "miss")
+    return hit
+
+def start_chat():
+    """Read a /chat request: ``(conversation_id, user_message, faq, cached_answer)``; the answer is None on a cache miss"""
+    data = request.get_json()
+    user_message = fit_field(data.get("message", ""), "message")
+    conversation_id = chat_conversation_id()
+    
+    faq = use_faq_cache(conversation_id, data)
+    hit = faq_lookup(user_message) if faq else None
+    if hit:
+        remember_chat(conversation_id, user_message, hit[0])
+        return conversation_id, user_message, faq, hit[0]
+    return conversation_id, user_message, faq, None
+
+def remember_reply(conversation_id, user_message, faq, response):
+    """Keep an LLM reply in the conversation and the FAQ cache, unless it is an error message"""
+    if not response.startswith(LLM_ERROR_PREFIXES):
+        remember_chat(conversation_id, user_message, response)
+        if faq:
+            faq_cache.add(user_message, response)
+
+def chat_response(response):
+    # Format the response as /chat/stream does, so both render the same
+    return jsonify({"response": format_chatbot_response(response)})
 
 @app.route("/chat", methods=["POST"])
 def chat():
     """AI Mentor chatbot for learning guidance"""
-    data = request.get_json()
-    user_message = data.get("message", "")
+    conversation_id, user_message, faq, response = start_chat()
+    if response is None:
+        prompt = build_chat_prompt(conversation_id, user_message)
+        response = prompt_llm(prompt, cache_ttl=CACHE_TTL["chat"], call_site="chat")
+        remember_reply(conversation_id, user_message, faq, response)
+    return chat_response(response)
+
+@asgi_app.route("/chat", methods=["POST"])
+async def chat_async():
+    """/chat under ASGI: the LLM call is awaited without holding a thread"""
+    conversation_id, user_message, faq, response = start_chat()
+    if response is None:
+        prompt = build_chat_prompt(conversation_id, user_message)
+        response = await aprompt_llm(prompt, cache_ttl=CACHE_TTL["chat"], call_site="chat")
+        remember_reply(conversation_id, user_message, faq, response)
+    return chat_response(response)
+
+class ChatStream:
+    """One /chat/stream reply sent as Server-Sent Events
     
-    context = """You are an AI Learning Mentor for the AI Mentor Hub. 
-    This app helps students and career-switchers by:
-    - Analyzing their skills and background
-    - Creating personalized learning paths
-    - Recommending quality online courses
-    - Building structured study schedules
-    - Providing career guidance
+    The WSGI and ASGI routes feed it the reply tokens and send on the events
+    each step returns. ``cached`` is the reply from the LLM response cache,
+    or None.
+    """
     
-    Answer questions about learning, courses, career advice, and study planning.
-    Be encouraging, practical, and specific.
+    def __init__(self, conversation_id, user_message, prompt, faq, route, cached=None):
+        self.conversation_id = conversation_id
+        self.user_message = user_message
+        self.prompt = prompt
+        self.faq = faq
+        self.route = route
+        self.cached = cached
+        self.formatter = ChatResponseFormatter()
+        self.blocks = []
+        self.reply = []
     
-    Instructions:
-    - Keep responses concise (3-4 lines max)
-    - Use bullet points when helpful
-    - Focus on actionable advice
-    """
+    def _block(self, html):
+        if not html:
+            return []
+        self.blocks.append(html)
+        return [sse_event("block", {"html": html})]
+    
+    def feed(self, token):
+        """Return the events for one token of the reply"""
+        self.reply.append(token)
+        return [sse_event("token", {"text": token})] + self._block(self.formatter.feed(token))
     
-    prompt = f"{context}\n\nUser question: {user_message}"
+    def finish(self, failed=False):
+        """Keep the reply unless it ended in an error, and return the closing events"""
+        reply = "".join(self.reply)
+        transcripts.log("chat_stream", self.prompt, reply, cached=self.cached is not None)
+        # A reply cut short by an error is neither counted nor kept
+        if not failed:
+            if self.cached is None:
+                usage.record("chat_stream", self.prompt, reply, route=self.route)
+                if llm_cache:
+                    llm_cache.set(LLM_MODEL, self.prompt, reply, CACHE_TTL["chat"])
+            remember_chat(self.conversation_id, self.user_message, reply)
+            if self.faq:
+                faq_cache.add(self.user_message, reply)
+        events = self._block(self.formatter.close())
+        events.append(sse_event("done", {"html": "".join(self.blocks)}))
+        return events
+
+def start_chat_stream():
+    """Read a /chat/stream request: ``(conversation_id, user_message, prompt, faq, cached_html)``; the HTML is None unless the FAQ cache answered"""
+    data = request.get_json()
+    user_message = fit_field(data.get("message", ""), "message")
+    conversation_id = chat_conversation_id()
+    prompt = build_chat_prompt(conversation_id, user_message)
+    
+    faq = use_faq_cache(conversation_id, data)
+    hit = faq_lookup(user_message) if faq else None
+    if hit:
+        remember_chat(conversation_id, user_message, hit[0])
+        return conversation_id, user_message, prompt, faq, format_chatbot_response(hit[0])
+    return conversation_id, user_message, prompt, faq, None
+
+def sse_response(events):
+    """A text/event-stream response relaying ``events`` as they are produced"""
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Streaming variant of /chat that relays the reply as Server-Sent Events"""
+    conversation_id, user_message, prompt, faq, cached_html = start_chat_stream()
+    if cached_html is not None:
+        # Answered from the FAQ cache: only the finished HTML is sent
+        return sse_response(sse_event("done", {"html": cached_html}))
     
-    # Save the conversation for debugging
-    os.makedirs("results", exist_ok=True)
-    with open("results/chat_prompt.txt", "w") as f:
-        f.write(prompt)
+    # Streaming runs after the request has been torn down
+    route = request.url_rule.rule
     
-    response = prompt_llm(prompt)
+    def generate():
+        cached = llm_cache.get(LLM_MODEL, prompt) if llm_cache else None
+        stream = ChatStream(conversation_id, user_message, prompt, faq, route, cached)
+        with metrics.llm_call("chat_stream") as outcome:
+            if cached is not None:
+                outcome["value"] = "cache_hit"
+            for token in [cached] if cached is not None else prompt_llm_stream(prompt, outcome):
+                yield from stream.feed(token)
+        yield from stream.finish(failed=outcome["value"] == "error")
     
-    # Format the response for better display
-    formatted_response = response.replace("•", "<br>•").replace("- ", "<br>• ")
-    if formatted_response.startswith("<br>"):
-        formatted_response = formatted_response[4:]  # Remove leading <br>
+    return sse_response(stream_with_context(generate()))
+
+@asgi_app.route("/chat/stream", methods=["POST"])
+async def chat_stream_async():
+    """/chat/stream under ASGI: tokens are awaited and sent from the event loop, holding no thread"""
+    conversation_id, user_message, prompt, faq, cached_html = start_chat_stream()
+    if cached_html is not None:
+        return sse_response(sse_event("done", {"html": cached_html}))
+    
+    route = request.url_rule.rule
+    
+    async def generate():
+        # The response cache and the bookkeeping in finish() may touch disk
+        cached = await asyncio.to_thread(llm_cache.get, LLM_MODEL, prompt) if llm_cache else None
+        stream = ChatStream(conversation_id, user_message, prompt, faq, route, cached)
+        with metrics.llm_call("chat_stream") as outcome:
+            if cached is not None:
+                outcome["value"] = "cache_hit"
+                for event in stream.feed(cached):
+                    yield event
+            else:
+                async for token in aprompt_llm_stream(prompt, outcome):
+                    for event in stream.feed(token):
+                        yield event
+        for event in await asyncio.to_thread(stream.finish, outcome["value"] == "error"):
+            yield event
     
-    return jsonify({"response": formatted_response})
+    # The ASGI adapter sends an async body from the event loop
+    return sse_response(generate())
 
 @app.route("/logout")
 def logout():
@@ -0,0 +1,243 @@
+"""Precomputed recommendation bundles for common (background, goal) profiles.
+
+``python bundles.py build`` clusters the profiles stored with past
+recommendations, generates one plan per cluster through the app's own
+pipeline (a few clusters at a time) and writes them to a versioned bundle
+file. At request time ``BundleIndex.lookup`` finds the nearest cluster and
+returns its bundle when the profile is similar enough, so the common
+profiles skip generation entirely.
+
+Profiles are compared by the cosine similarity of their term weights
+(``semantic_cache.tokenize``), with goal terms counting more than
+background terms.
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from semantic_cache import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the file layout changes; other formats are not loaded
+BUNDLE_FORMAT = 1
+
+DEFAULT_BUNDLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bundles.json")
+
+# The goal decides the plan; the background only refines it
+GOAL_WEIGHT = 1.0
+BACKGROUND_WEIGHT = 0.5
+
+
+def profile_vector(background, goal):
+    """Return the normalized term weights of a profile."""
+    weights = {}
+    for field, text, weight in (("goal", goal, GOAL_WEIGHT), ("background", background, BACKGROUND_WEIGHT)):
+        for term in tokenize(text or ""):
+            key = f"{field}:{term}"
+            weights[key] = weights.get(key, 0.0) + weight
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {key: weight / norm for key, weight in weights.items()} if norm else {}
+
+
+def similarity(first, second):
+    """Cosine similarity of two normalized vectors."""
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(key, 0.0) for key, weight in first.items())
+
+
+def cluster_profiles(profiles, threshold=0.8):
+    """Group profiles whose similarity to a cluster's leader clears ``threshold``.
+
+    Identical profiles are counted together and the most common ones lead
+    their clusters. Returns clusters as dicts with the leader's
+    ``background`` and ``goal`` and the number of profiles (``size``),
+    largest first.
+    """
+    counts = {}
+    for profile in profiles:
+        background = " ".join((profile.get("background") or "").split())
+        goal = " ".join((profile.get("goal") or "").split())
+        if goal:
+            key = (background.lower(), goal.lower())
+            entry = counts.setdefault(key, {"background": background, "goal": goal, "count": 0})
+            entry["count"] += 1
+
+    clusters = []
+    for entry in sorted(counts.values(), key=lambda entry: -entry["count"]):
+        vector = profile_vector(entry["background"], entry["goal"])
+        for cluster in clusters:
+            if similarity(vector, cluster["vector"]) >= threshold:
+                cluster["size"] += entry["count"]
+                break
+        else:
+            clusters.append({
+                "background": entry["background"],
+                "goal": entry["goal"],
+                "size": entry["count"],
+                "vector": vector,
+            })
+
+    clusters.sort(key=lambda cluster: -cluster["size"])
+    return [{key: cluster[key] for key in ("background", "goal", "size")} for cluster in clusters]
+
+
+def build_bundles(clusters, generate, workers=4):
+    """Generate a plan for each cluster, at most ``workers`` at a time.
+
+    ``generate(background, goal)`` returns ``(recommendations, schedule)``
+    and should raise rather than return fallback content; clusters it
+    fails for are left out.
+    """
+    def build(cluster):
+        try:
+            recommendations, schedule = generate(cluster["background"], cluster["goal"])
+        except Exception as e:
+            logger.error("Could not generate bundle for %r: %s", cluster["goal"], e)
+            return None
+        return dict(cluster, recommendations=recommendations, schedule=schedule)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bundles") as executor:
+        bundles = [bundle for bundle in executor.map(build, clusters) if bundle is not None]
+
+    now = datetime.now()
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": now.strftime("%Y%m%d%H%M%S"),
+        "created_at": now.isoformat(),
+        "bundles": bundles,
+    }
+
+
+def write_bundles(path, data):
+    """Write a bundle file atomically (temp file + rename)."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bundles.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class BundleIndex:
+    """Bundles plus an inverted index from profile term to bundle."""
+
+    def __init__(self, bundles=(), threshold=0.85, version=None):
+        self.threshold = threshold
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._bundles = [bundle for bundle in bundles if bundle.get("recommendations")]
+        self._vectors = [profile_vector(bundle.get("background"), bundle.get("goal")) for bundle in self._bundles]
+        self._postings = {}
+        for index, vector in enumerate(self._vectors):
+            for key in vector:
+                self._postings.setdefault(key, []).append(index)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_BUNDLE_PATH, threshold=0.85):
+        """Load a bundle file; a missing, broken or unknown-format file gives no bundles."""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(threshold=threshold)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load bundles %s: %s", path, e)
+            return cls(threshold=threshold)
+        if data.get("format") != BUNDLE_FORMAT:
+            logger.warning("Ignoring bundles %s with unsupported format %s", path, data.get("format"))
+            return cls(threshold=threshold)
+        return cls(data.get("bundles", []), threshold=threshold, version=data.get("version"))
+
+    def __len__(self):
+        return len(self._bundles)
+
+    def lookup(self, background, goal):
+        """Return ``(bundle, similarity)`` for the nearest bundle, or None.
+
+        The bundle is shared; callers must copy it before changing it.
+        """
+        query = profile_vector(background, goal)
+        candidates = set()
+        for key in query:
+            candidates.update(self._postings.get(key, ()))
+        best_index, best_score = None, 0.0
+        for index in candidates:
+            score = similarity(query, self._vectors[index])
+            if score > best_score:
+                best_index, best_score = index, score
+
+        with self._lock:
+            if best_index is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._bundles[best_index], best_score
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "bundles": len(self._bundles),
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "threshold": self.threshold,
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute recommendation bundles for common profiles.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="cluster stored profiles and generate a bundle per cluster")
+    build.add_argument("--app", default="app", choices=("app", "bot"), help="whose generation pipeline to use")
+    build.add_argument("--output", default=os.getenv("BUNDLES_PATH", DEFAULT_BUNDLE_PATH))
+    build.add_argument("--similarity", type=float, default=0.8, help="how similar profiles in one cluster are")
+    build.add_argument("--min-size", type=int, default=2, help="smallest cluster worth a bundle")
+    build.add_argument("--max-bundles", type=int, default=50)
+    build.add_argument("--workers", type=int, default=4, help="clusters generated at once")
+    args = parser.parse_args(argv)
+
+    # Importing the app sets up its storage, LLM client and pipeline
+    module = importlib.import_module(args.app)
+    if module.client is None:
+        print("No LLM client configured (check TOGETHER_API_KEY or LLM_BACKEND)")
+        return 1
+
+    profiles = [profile for _, profile in module.storage.profiles()]
+    clusters = [
+        cluster for cluster in cluster_profiles(profiles, args.similarity)
+        if cluster["size"] >= args.min_size
+    ][:args.max_bundles]
+    print(f"Found {len(clusters)} clusters in {len(profiles)} stored profiles")
+
+    # Strict: a cluster whose plan fell back (e.g. during an outage) is skipped
+    generate = partial(module.generate_user_plan, strict=True)
+    data = build_bundles(clusters, generate, workers=args.workers)
+    write_bundles(args.output, data)
+    skipped = len(clusters) - len(data["bundles"])
+    if skipped:
+        print(f"Skipped {skipped} clusters whose generation failed or fell back")
+    print(f"Wrote {len(data['bundles'])} bundles (version {data['version']}) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
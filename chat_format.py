@@ -0,0 +1,102 @@
+"""HTML formatting for chatbot replies, whole or streamed."""
+import json
+import re
+
+BOLD_PATTERN = re.compile(r'\*\*([^*]+)\*\*')
+
+
+class ChatResponseFormatter:
+    """Incremental version of format_chatbot_response.
+
+    Feed it text as it arrives; every call returns the HTML for the lines
+    that were completed by that chunk, so finished <li>/<p>/<h3> blocks can
+    be sent to the browser before the rest of the reply exists.
+    """
+
+    def __init__(self, bold=True):
+        self.bold = bold
+        self._buffer = ""
+        self._in_list = False
+        self._received = False
+
+    def feed(self, text):
+        """Add a chunk of reply text and return HTML for any completed lines."""
+        if not text:
+            return ""
+        self._received = True
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        return ''.join(self._format_line(line) for line in lines)
+
+    def close(self):
+        """Flush the last (unterminated) line and close any open list."""
+        if not self._received:
+            return ""
+        html = self._format_line(self._buffer)
+        self._buffer = ""
+        if self._in_list:
+            html += '</ul>'
+            self._in_list = False
+        return html
+
+    def _format_line(self, line):
+        if self.bold:
+            line = BOLD_PATTERN.sub(r'<strong>\1</strong>', line)
+        line = line.strip()
+        html = []
+
+        if not line:
+            if self._in_list:
+                html.append('</ul>')
+                self._in_list = False
+            html.append('<br>')
+
+        # Handle bullet points
+        elif line.startswith('•') or line.startswith('-') or line.startswith('*'):
+            if not self._in_list:
+                html.append('<ul>')
+                self._in_list = True
+            content = line[1:].strip()
+            html.append(f'<li>{content}</li>')
+
+        # Handle numbered lists
+        elif line[0].isdigit() and '. ' in line:
+            if not self._in_list:
+                html.append('<ol>')
+                self._in_list = True
+            content = line.split('. ', 1)[1]
+            html.append(f'<li>{content}</li>')
+
+        # Handle headers (lines that are just bold text)
+        elif line.startswith('<strong>') and line.endswith('</strong>') and len(line) > 17:
+            if self._in_list:
+                html.append('</ul>')
+                self._in_list = False
+            content = line[8:-9].strip()  # Remove <strong> and </strong>
+            html.append(f'<h3>{content}</h3>')
+
+        # Regular paragraphs
+        else:
+            if self._in_list:
+                html.append('</ul>')
+                self._in_list = False
+            html.append(f'<p>{line}</p>')
+
+        return ''.join(html)
+
+
+def format_chatbot_response(response):
+    """Format chatbot response with proper HTML structure"""
+    if not response:
+        return ""
+
+    # First, convert all **text** patterns to <strong>text</strong>
+    formatted = BOLD_PATTERN.sub(r'<strong>\1</strong>', response)
+
+    formatter = ChatResponseFormatter(bold=False)
+    return formatter.feed(formatted) + formatter.close()
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
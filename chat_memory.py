@@ -0,0 +1,159 @@
+"""Server-side chat memory with a bounded prompt size.
+
+Each conversation keeps its recent turns verbatim plus a rolling summary of
+everything older. When the turns outgrow the history token budget, the
+oldest ones are folded into the summary in the background, so the prompt
+stays roughly the same size however long the conversation runs.
+Conversations idle for longer than ``idle_ttl`` are evicted.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from prompt_budget import estimate_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-memory")
+
+
+def format_turns(turns):
+    return "\n".join(f"{'User' if role == 'user' else 'Mentor'}: {text}" for role, text in turns)
+
+
+def extractive_summary(summary, turns, max_tokens):
+    """Fallback summary: the old summary plus the folded turns, truncated."""
+    text = "\n".join(part for part in (summary, format_turns(turns)) if part)
+    return truncate_tokens(text, max_tokens)
+
+
+class Conversation:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []
+        self.last_active = time.time()
+        self.compacting = False
+
+
+class ConversationStore:
+    """Per-session conversations, held in memory by the worker process.
+
+    ``summarize(summary, turns)`` returns the new rolling summary; it is
+    called on a background thread and may raise, in which case the turns are
+    folded in extractively. Without it, turns are always folded extractively.
+    """
+
+    def __init__(self, summarize=None, history_tokens=600, summary_tokens=200, idle_ttl=1800, max_conversations=1000):
+        self.summarize = summarize
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.idle_ttl = idle_ttl
+        self.max_conversations = max_conversations
+        self.compactions = 0
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, conversation_id, now):
+        self._evict(now)
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            while len(self._conversations) >= self.max_conversations:
+                self._conversations.popitem(last=False)
+            conversation = self._conversations[conversation_id] = Conversation()
+        else:
+            self._conversations.move_to_end(conversation_id)
+        conversation.last_active = now
+        return conversation
+
+    def _evict(self, now):
+        # Least recently active first, so idle conversations are at the front
+        while self._conversations:
+            conversation_id, conversation = next(iter(self._conversations.items()))
+            if now - conversation.last_active <= self.idle_ttl:
+                break
+            del self._conversations[conversation_id]
+
+    def build_prompt(self, conversation_id, context, question):
+        """Return the chat prompt for ``question`` with the conversation's memory.
+
+        Only the newest turns that fit in the history budget are included;
+        with no history the prompt is the same as a stateless one.
+        """
+        with self._lock:
+            conversation = self._get(conversation_id, time.time())
+            summary = conversation.summary
+            recent = []
+            budget = self.history_tokens
+            for role, text in reversed(conversation.turns):
+                budget -= estimate_tokens(text)
+                if budget < 0:
+                    break
+                recent.append((role, text))
+            recent.reverse()
+
+        prompt = context
+        if summary:
+            prompt += f"\n\nSummary of the conversation so far:\n{summary}"
+        if recent:
+            prompt += f"\n\nRecent conversation:\n{format_turns(recent)}"
+        return f"{prompt}\n\nUser question: {question}"
+
+    def add_exchange(self, conversation_id, question, answer):
+        """Record a question and its answer, compacting older turns if needed."""
+        with self._lock:
+            conversation = self._get(conversation_id, time.time())
+            conversation.turns.append(("user", question))
+            conversation.turns.append(("assistant", answer))
+            if conversation.compacting:
+                return
+
+            # Fold the oldest turns until the rest fits, always keeping the newest exchange
+            used = sum(estimate_tokens(text) for _, text in conversation.turns)
+            fold = 0
+            while used > self.history_tokens and fold < len(conversation.turns) - 2:
+                used -= estimate_tokens(conversation.turns[fold][1])
+                fold += 1
+            if not fold:
+                return
+            conversation.compacting = True
+            summary, old_turns = conversation.summary, conversation.turns[:fold]
+
+        if self.summarize is None:
+            self._compact(conversation, summary, old_turns)
+        else:
+            _executor.submit(contextvars.copy_context().run, self._compact, conversation, summary, old_turns)
+
+    def _compact(self, conversation, summary, old_turns):
+        new_summary = None
+        if self.summarize is not None:
+            try:
+                new_summary = self.summarize(summary, old_turns)
+            except Exception as e:
+                logger.warning("Could not summarize conversation, truncating instead: %s", e)
+        if new_summary:
+            new_summary = truncate_tokens(new_summary.strip(), self.summary_tokens)
+        else:
+            new_summary = extractive_summary(summary, old_turns, self.summary_tokens)
+
+        with self._lock:
+            conversation.summary = new_summary
+            del conversation.turns[:len(old_turns)]
+            conversation.compacting = False
+            self.compactions += 1
+
+    def has_history(self, conversation_id):
+        """Return True if the conversation has any turns or summary yet."""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            return conversation is not None and bool(conversation.turns or conversation.summary)
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"conversations": len(self._conversations), "compactions": self.compactions}
@@ -0,0 +1,103 @@
+"""gzip/brotli compression for dynamic responses.
+
+``ResponseCompressor`` compresses HTML, JSON and other text responses of at
+least ``min_size`` bytes with the best encoding the client accepts (brotli
+needs the optional ``brotli`` package). Streamed responses, such as the
+chat's server-sent events, and responses that are already encoded, such as
+the precompressed ``/assets/`` files, are left alone.
+
+A compressed response is a different representation, so a strong ETag gets
+the encoding appended (``"abc-gzip"``). The suffix is stripped from
+``If-None-Match`` before the request reaches its route, so routes compare
+against their own ETags and the 304 they return gets the suffix back.
+"""
+import gzip
+import re
+
+from flask import g, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+# Encodings we can produce, in order of preference
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+COMPRESSIBLE_MIMETYPES = {
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+}
+
+_ETAG_SUFFIX = re.compile(r'-(br|gzip)"')
+
+
+def compress(data, encoding, level=6):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+class ResponseCompressor:
+    """Negotiates and applies response compression for a Flask app."""
+
+    def __init__(self, min_size=500, level=6, enabled=True):
+        self.min_size = min_size
+        self.level = level
+        self.enabled = enabled
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def _strip_etag_suffixes():
+            value = request.environ.get("HTTP_IF_NONE_MATCH")
+            if value:
+                match = _ETAG_SUFFIX.search(value)
+                if match:
+                    g._etag_encoding = match.group(1)
+                    request.environ["HTTP_IF_NONE_MATCH"] = _ETAG_SUFFIX.sub('"', value)
+
+        @app.after_request
+        def _compress(response):
+            return self.process(response)
+
+    def process(self, response):
+        """Compress ``response`` in place if worthwhile and the client accepts it."""
+        if response.status_code == 304:
+            encoding = g.pop("_etag_encoding", None)
+            etag, weak = response.get_etag()
+            if encoding and etag and not weak:
+                response.set_etag(f"{etag}-{encoding}")
+            return response
+
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        if response.content_length is not None and response.content_length < self.min_size:
+            return response
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        response.set_data(compress(data, encoding, self.level))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
@@ -0,0 +1,142 @@
+"""Offline course catalog and keyword-based recommendation engine.
+
+The catalog is a JSON list of courses (``data/courses.json`` by default)
+with the same fields as LLM recommendations plus ``tags``. ``recommend``
+ranks courses against a user's goal and background with TF-IDF keyword
+scores over an inverted index, adjusted for how well each course's level
+fits the learner. It runs in milliseconds, so it can answer on its own or
+stand in whenever the LLM is down.
+"""
+import json
+import logging
+import math
+import os
+
+from planner import level_rank
+from semantic_cache import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "courses.json")
+
+# Matches in tags count most, then the title, then the description
+FIELD_WEIGHTS = {"tags": 3.0, "title": 2.0, "desc": 1.0}
+
+# The goal decides what to learn; the background only nudges the ranking
+GOAL_WEIGHT = 1.0
+BACKGROUND_WEIGHT = 0.3
+
+# Words that say how someone wants to learn rather than what
+FILLER_TERMS = frozenset("learn become career job start master improve understand study".split())
+
+# Courses scoring below this fraction of the best match are left out
+MIN_RELATIVE_SCORE = 0.3
+
+# Score multiplier by course level minus the learner's level
+LEVEL_FIT = {-2: 0.6, -1: 0.8, 0: 1.2, 1: 1.0, 2: 0.6}
+
+EXPERIENCED_TERMS = {"developer", "engineer", "programmer", "analyst", "scientist", "experience", "experienced"}
+ADVANCED_TERMS = {"senior", "expert", "advanced", "lead", "architect", "professional"}
+
+RECOMMENDATION_FIELDS = ("title", "url", "platform", "duration", "level", "rating", "desc")
+
+
+def learner_level(background):
+    """Guess the learner's level (0-2, as in planner.LEVEL_ORDER) from their background."""
+    words = set(tokenize(background or ""))
+    if words & ADVANCED_TERMS:
+        return 2
+    if words & EXPERIENCED_TERMS:
+        return 1
+    return 0
+
+
+class CourseCatalog:
+    """Courses plus an inverted index from term to weighted course matches."""
+
+    def __init__(self, courses):
+        self.courses = [course for course in courses if course.get("title") and course.get("url")]
+        self._postings = {}
+        for index, course in enumerate(self.courses):
+            weights = {}
+            for field, field_weight in FIELD_WEIGHTS.items():
+                value = course.get(field) or ""
+                text = " ".join(value) if isinstance(value, list) else str(value)
+                for term in tokenize(text):
+                    weights[term] = weights.get(term, 0.0) + field_weight
+            for term, weight in weights.items():
+                self._postings.setdefault(term, {})[index] = weight
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOG_PATH):
+        """Load a catalog from a JSON file; a missing or broken file gives an empty catalog."""
+        try:
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load course catalog %s: %s", path, e)
+            return cls([])
+
+    def __len__(self):
+        return len(self.courses)
+
+    def _idf(self, term):
+        return math.log((1 + len(self.courses)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def recommend(self, background, goal, limit=6):
+        """Return up to ``limit`` recommendations for the user, easiest first.
+
+        Each has the usual recommendation fields, with ``why`` naming the
+        course tags that matched the goal. Courses tagged "general" fill any
+        remaining slots when too few courses match.
+        """
+        if not self.courses:
+            return []
+
+        query = {}
+        for terms, weight in ((tokenize(goal or ""), GOAL_WEIGHT), (tokenize(background or ""), BACKGROUND_WEIGHT)):
+            for term in terms:
+                if term in FILLER_TERMS:
+                    continue
+                query[term] = max(query.get(term, 0.0), weight)
+
+        scores = {}
+        matched = {}
+        for term, query_weight in query.items():
+            idf = self._idf(term)
+            for index, weight in self._postings.get(term, {}).items():
+                scores[index] = scores.get(index, 0.0) + query_weight * idf * weight
+                if query_weight == GOAL_WEIGHT:
+                    matched.setdefault(index, []).append(term)
+
+        level = learner_level(background)
+        for index in scores:
+            offset = min(max(level_rank(self.courses[index].get("level")) - level, -2), 2)
+            scores[index] *= LEVEL_FIT[offset]
+
+        cutoff = max(scores.values(), default=0.0) * MIN_RELATIVE_SCORE
+        ranked = sorted(
+            (index for index, score in scores.items() if score >= cutoff),
+            key=lambda index: (-scores[index], index),
+        )[:limit]
+        if len(ranked) < limit:
+            general = [
+                index for index, course in enumerate(self.courses)
+                if "general" in course.get("tags", []) and index not in ranked
+            ]
+            ranked += general[:limit - len(ranked)]
+
+        # Present the path from the easiest course to the hardest
+        ranked.sort(key=lambda index: (level_rank(self.courses[index].get("level")), -scores.get(index, 0.0)))
+        return [self._recommendation(self.courses[index], matched.get(index), goal) for index in ranked]
+
+    @staticmethod
+    def _recommendation(course, matched_terms, goal):
+        recommendation = {field: course.get(field, "") for field in RECOMMENDATION_FIELDS}
+        matched_terms = set(matched_terms or ())
+        tags = [tag for tag in course.get("tags", []) if matched_terms & set(tokenize(tag))]
+        if tags:
+            recommendation["why"] = f"Covers {', '.join(tags[:3])} for your goal: {goal}"
+        else:
+            recommendation["why"] = "Builds a strong general foundation for your learning path"
+        return recommendation
@@ -0,0 +1,205 @@
+"""Generation helpers shared by app.py and bot.py.
+
+The apps pass in their own ``get_recommendations``/``build_schedule`` so the
+prompts and parsing stay where they are; this module only decides how the
+LLM calls are scheduled relative to each other. ``agenerate_plan`` is the
+same for the coroutine versions the ASGI routes use.
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from planner import level_rank
+
+# "sequential": recommendations first, then a schedule built from them.
+# "pipelined": both prompts run at once; the schedule is started from
+#              (background, goal) alone and reconciled afterwards.
+# "combined": one prompt returns both; needs ``get_combined_plan``.
+GENERATION_MODES = ("sequential", "pipelined", "combined")
+
+# Runs the recommendations call of each pipelined generation (the schedule
+# call stays on the caller's thread), so it needs a slot per generation that
+# may run at once: by default twice JOB_WORKERS, leaving room for the
+# synchronous routes and prefetches next to the job workers
+GENERATION_THREADS = int(os.getenv("GENERATION_THREADS", str(2 * int(os.getenv("JOB_WORKERS", "4")))))
+
+_executor = ThreadPoolExecutor(max_workers=GENERATION_THREADS, thread_name_prefix="generation")
+
+# Platforms whose name in a schedule item means it points at a specific course
+KNOWN_PLATFORMS = (
+    "coursera", "udemy", "edx", "khan academy", "freecodecamp", "udacity", "pluralsight",
+    "linkedin learning", "datacamp", "codecademy", "youtube",
+)
+
+_fallbacks = contextvars.ContextVar("generation_fallbacks", default=None)
+
+
+class PlanFallbackError(Exception):
+    """Raised by a strict generation when any part of the plan was a fallback."""
+
+
+def note_fallback(call_site):
+    """Record that ``call_site`` served fallback content inside a ``fallback_scope``."""
+    fallbacks = _fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(call_site)
+
+
+@contextmanager
+def fallback_scope():
+    """Collect the call sites that fell back inside the block.
+
+    Yields the list that ``note_fallback`` appends to. Worker threads
+    started with the caller's context share the same list.
+    """
+    fallbacks = []
+    token = _fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _fallbacks.reset(token)
+
+
+def generate_plan(
+    background,
+    goal,
+    get_recommendations,
+    build_schedule,
+    mode="pipelined",
+    get_combined_plan=None,
+    fallback_schedule=None,
+    plan_locally=None,
+):
+    """Return ``(recommendations, schedule)`` for a user.
+
+    In pipelined mode the cold path costs roughly one LLM round trip instead
+    of two; combined mode also halves the number of calls and prompt tokens.
+    If the speculative schedule comes back as the app's static
+    ``fallback_schedule``, it is replaced by ``plan_locally(recommendations)``
+    once the recommendations are known.
+    Exceptions from any call propagate to the caller, which keeps the
+    existing fallback handling in the routes unchanged.
+    """
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation mode: {mode}")
+
+    if mode == "combined":
+        if get_combined_plan is None:
+            raise ValueError("Combined generation mode needs get_combined_plan")
+        return get_combined_plan(background, goal)
+
+    if mode == "sequential":
+        recommendations = get_recommendations(background, goal)
+        return recommendations, build_schedule(background, goal, recommendations)
+
+    # Speculative schedule: no recommendations are known yet. The
+    # recommendations run in a copy of the caller's context (e.g. usage
+    # attribution) while the caller's own thread builds the schedule
+    recommendations_future = _executor.submit(contextvars.copy_context().run, get_recommendations, background, goal)
+    schedule = build_schedule(background, goal, [])
+    recommendations = recommendations_future.result()
+    return _finish_pipelined(recommendations, schedule, fallback_schedule, plan_locally)
+
+
+async def agenerate_plan(
+    background,
+    goal,
+    get_recommendations,
+    build_schedule,
+    mode="pipelined",
+    get_combined_plan=None,
+    fallback_schedule=None,
+    plan_locally=None,
+):
+    """Like ``generate_plan``, with coroutine functions for the LLM calls.
+
+    Pipelined mode runs both prompts with ``asyncio.gather`` on the event
+    loop, so a generation holds no thread while it waits on the LLM.
+    ``plan_locally`` is still a plain function and runs on a thread.
+    """
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation mode: {mode}")
+
+    if mode == "combined":
+        if get_combined_plan is None:
+            raise ValueError("Combined generation mode needs get_combined_plan")
+        return await get_combined_plan(background, goal)
+
+    if mode == "sequential":
+        recommendations = await get_recommendations(background, goal)
+        return recommendations, await build_schedule(background, goal, recommendations)
+
+    # Tasks copy the caller's context, like the executor path above
+    recommendations, schedule = await asyncio.gather(
+        get_recommendations(background, goal), build_schedule(background, goal, [])
+    )
+    return await asyncio.to_thread(_finish_pipelined, recommendations, schedule, fallback_schedule, plan_locally)
+
+
+def _finish_pipelined(recommendations, schedule, fallback_schedule, plan_locally):
+    """Replace a static fallback schedule with a local plan and reconcile it with the recommendations."""
+    if plan_locally is not None and fallback_schedule is not None and schedule == fallback_schedule:
+        schedule = plan_locally(recommendations) or schedule
+    return recommendations, reconcile_schedule(schedule, recommendations)
+
+
+def reconcile_schedule(schedule, recommendations):
+    """Tie a speculatively built schedule back to the final recommendations.
+
+    Items that name a course on a known platform but none of the
+    recommended titles point at a course the user was never given; each is
+    replaced by a step on a recommended course (easiest level first). If the
+    schedule then still mentions no recommended course, the first one is
+    added to week 1 so the plan points at something the user can open.
+    """
+    if not isinstance(schedule, list) or not isinstance(recommendations, list):
+        return schedule
+
+    ordered = sorted(
+        (rec for rec in recommendations if isinstance(rec, dict) and rec.get("title")),
+        key=lambda rec: level_rank(rec.get("level")),
+    )
+    if not ordered or not schedule:
+        return schedule
+
+    titles = [rec["title"].lower() for rec in ordered]
+    platforms = set(KNOWN_PLATFORMS)
+    platforms.update(str(rec.get("platform") or "").lower() for rec in ordered)
+    platforms.discard("")
+
+    def names_recommended_course(item):
+        return any(title in item.lower() for title in titles)
+
+    def names_other_course(item):
+        text = item.lower()
+        return not names_recommended_course(item) and any(platform in text for platform in platforms)
+
+    weeks = [week for week in schedule if isinstance(week, dict) and isinstance(week.get("items"), list)]
+    started = set()
+    replaced = 0
+    for week in weeks:
+        items = []
+        for item in week["items"]:
+            if isinstance(item, str) and names_other_course(item):
+                rec = ordered[replaced % len(ordered)]
+                replaced += 1
+                verb = "Continue" if rec["title"] in started else "Start"
+                started.add(rec["title"])
+                item = _course_label(verb, rec)
+            items.append(item)
+        week["items"] = items
+
+    if not any(isinstance(item, str) and names_recommended_course(item) for week in weeks for item in week["items"]):
+        if weeks and weeks[0] is schedule[0]:
+            weeks[0]["items"].insert(0, _course_label("Start", ordered[0]))
+    return schedule
+
+
+def _course_label(verb, rec):
+    """A schedule item like "Start <title> (<platform>)"."""
+    label = f"{verb} {rec['title']}"
+    if rec.get("platform"):
+        label += f" ({rec['platform']})"
+    return label
@@ -0,0 +1,174 @@
+"""Background job queue for slow generation work.
+
+Routes enqueue a function, hand the job ID back to the browser right away,
+and the page polls ``/jobs/<id>`` until the job has finished. A bounded
+thread pool runs the jobs, so a few web workers can serve many users who
+are all waiting on the LLM at the same time.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already waiting to run."""
+
+
+class Job:
+    """State of one queued call. ``result`` is only meant for in-process use."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, key=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = self.QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._finished = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; return True if it did."""
+        return self._finished.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """Call ``fn(job)`` once the job finishes (right away if it already has)."""
+        with self._callbacks_lock:
+            if not self._finished.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def remove_done_callback(self, fn):
+        """Forget a callback added with ``add_done_callback`` that hasn't run yet."""
+        with self._callbacks_lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    async def wait_async(self, timeout=None):
+        """Like ``wait``, but awaits the job on the running event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def wake(job):
+            loop.call_soon_threadsafe(lambda: finished.done() or finished.set_result(True))
+
+        self.add_done_callback(wake)
+        try:
+            return await asyncio.wait_for(finished, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # An abandoned wait must not leave its callback on a long-running job
+            self.remove_done_callback(wake)
+
+    def _finish(self, status):
+        # finished_at is set first: anything that sees a final status can rely on it
+        self.finished_at = time.time()
+        self.status = status
+        with self._callbacks_lock:
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                logger.error("Job %s callback failed: %s", self.id, e)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Runs jobs on at most ``max_workers`` threads.
+
+    At most ``max_pending`` jobs may be queued or running at once; beyond
+    that ``submit`` raises QueueFullError. Finished jobs are kept for
+    ``retention`` seconds so late polls still see the result.
+    """
+
+    def __init__(self, max_workers=4, max_pending=100, retention=600):
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, key=None, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return its Job."""
+        job = Job(key=key)
+        with self._lock:
+            self._prune()
+            pending = sum(1 for existing in self._jobs.values() if not existing.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs already pending")
+            self._jobs[job.id] = job
+        # Run in a copy of the submitter's context variables
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return the job with this ID, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """Return the unfinished job for ``key``, if there is one."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and not job.finished:
+                    return job
+        return None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = Job.RUNNING
+        status = Job.FAILED
+        try:
+            job.result = fn(*args, **kwargs)
+            status = Job.DONE
+        except Exception as e:
+            logger.error("Job %s failed: %s", job.id, e)
+            job.error = str(e)
+        finally:
+            job._finish(status)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,389 @@
+"""Resilient LLM client used by app.py and bot.py.
+
+LLMClient wraps a backend (Together, or an offline fake) with:
+
+- one pooled keep-alive HTTP connection pool shared by every request thread
+- a deadline per call that also bounds the time spent retrying
+- jittered exponential backoff for retryable errors (timeouts, 429, 5xx)
+- a circuit breaker that fails calls immediately while the upstream is down,
+  so the routes can fall back to their static lists instead of waiting
+
+``acomplete`` and ``astream`` are the same calls for the ASGI routes: they
+await the upstream on the event loop, so a waiting request doesn't hold a
+thread.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+
+class LLMError(Exception):
+    """Base class for errors raised by LLMClient."""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without calling the upstream while the circuit breaker is open."""
+
+
+class DeadlineExceededError(LLMError):
+    """Raised when a call (including its retries) runs past its deadline."""
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects calls for ``reset_timeout`` seconds. It then lets one trial call
+    through (half-open); success closes it, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go to the upstream right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open trial slot when an attempt ends without a verdict.
+
+        Covers attempts interrupted before reaching the upstream or cancelled
+        mid-call, so the next call can run the trial instead of being
+        rejected until restart.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class TogetherBackend:
+    """Backend that talks to the Together API over a pooled httpx client."""
+
+    def __init__(self, api_key, pool_size=20, keepalive_expiry=30.0, async_pool_size=200):
+        import httpx
+        import together
+        from together import Together
+
+        self.api_key = api_key
+        self.keepalive_expiry = keepalive_expiry
+        self.async_pool_size = async_pool_size
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        # Retries are handled by LLMClient so the circuit breaker sees them
+        self.client = Together(api_key=api_key, http_client=http_client, max_retries=0)
+        self._async_client = None
+        self.retryable_errors = (
+            together.APITimeoutError,
+            together.APIConnectionError,
+            together.RateLimitError,
+            together.InternalServerError,
+        )
+
+    def complete(self, prompt, model, timeout, **options):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+            **options,
+        )
+        return response.choices[0].message.content
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            # Created on first use, inside the event loop that will drive it
+            import httpx
+            from together import AsyncTogether
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.async_pool_size,
+                    max_keepalive_connections=self.async_pool_size,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._async_client = AsyncTogether(api_key=self.api_key, http_client=http_client, max_retries=0)
+        return self._async_client
+
+    async def acomplete(self, prompt, model, timeout, **options):
+        response = await self._get_async_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+            **options,
+        )
+        return response.choices[0].message.content
+
+    def stream(self, prompt, model, timeout, **options):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            timeout=timeout,
+            **options,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def astream(self, prompt, model, timeout, **options):
+        stream = await self._get_async_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            timeout=timeout,
+            **options,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def is_retryable(self, error):
+        return isinstance(error, self.retryable_errors)
+
+
+class FakeBackend:
+    """Offline backend for development and tests.
+
+    ``responder`` maps a prompt to the reply text (by default a short canned
+    answer). ``latency`` simulates upstream delay, and ``failures`` is a list
+    of exceptions raised by successive calls before they start succeeding.
+    """
+
+    def __init__(self, responder=None, latency=0.0, failures=None):
+        self.responder = responder or (lambda prompt: "This is a placeholder response from the offline LLM backend.")
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next_failure(self):
+        with self._lock:
+            self.calls += 1
+            return self.failures.pop(0) if self.failures else None
+
+    def complete(self, prompt, model, timeout, **options):
+        failure = self._next_failure()
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError("Fake backend timed out")
+            time.sleep(self.latency)
+        if failure is not None:
+            raise failure
+        return self.responder(prompt)
+
+    async def acomplete(self, prompt, model, timeout, **options):
+        failure = self._next_failure()
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                await asyncio.sleep(timeout)
+                raise TimeoutError("Fake backend timed out")
+            await asyncio.sleep(self.latency)
+        if failure is not None:
+            raise failure
+        return self.responder(prompt)
+
+    def stream(self, prompt, model, timeout, **options):
+        text = self.complete(prompt, model, timeout, **options)
+        for index in range(0, len(text), 8):
+            yield text[index:index + 8]
+
+    async def astream(self, prompt, model, timeout, **options):
+        text = await self.acomplete(prompt, model, timeout, **options)
+        for index in range(0, len(text), 8):
+            yield text[index:index + 8]
+
+    def is_retryable(self, error):
+        return isinstance(error, (TimeoutError, ConnectionError))
+
+
+class LLMClient:
+    """Chat-completion client with deadlines, retries and a circuit breaker."""
+
+    def __init__(self, backend, timeout=30.0, max_retries=2, backoff_base=0.5, backoff_max=4.0, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+    def _backoff(self, attempt):
+        # "Full jitter": a random delay up to the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _remaining(self, deadline):
+        """Time left for the next attempt; raises if there is none or the circuit is open.
+
+        The deadline is checked first so a call that has already run out of
+        time never claims the half-open trial slot.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError("LLM call deadline exceeded")
+
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM upstream unavailable (circuit breaker open)")
+        return remaining
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Record a failed attempt and return how long to wait before the next one.
+
+        Re-raises ``error`` (or a deadline error) when it shouldn't be retried.
+        """
+        if not self.backend.is_retryable(error):
+            # The upstream answered (e.g. a 400), so it is healthy
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise DeadlineExceededError(f"LLM call deadline exceeded after error: {error}") from error
+        return delay
+
+    def _call(self, operation, timeout):
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline)
+            try:
+                result = operation(remaining)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def _acall(self, operation, timeout):
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline)
+            try:
+                result = await operation(remaining)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            except BaseException:
+                # e.g. CancelledError when the ASGI client disconnects
+                self.breaker.release_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def complete(self, prompt, model, timeout=None, **options):
+        """Return the completion text for ``prompt``."""
+        return self._call(lambda remaining: self.backend.complete(prompt, model, remaining, **options), timeout)
+
+    async def acomplete(self, prompt, model, timeout=None, **options):
+        """Return the completion text for ``prompt``, awaiting the upstream on the event loop."""
+        return await self._acall(lambda remaining: self.backend.acomplete(prompt, model, remaining, **options), timeout)
+
+    def stream(self, prompt, model, timeout=None, **options):
+        """Yield completion text as it arrives.
+
+        Only the request up to the first chunk is retried; once text has been
+        handed to the caller a failure is raised as-is.
+        """
+        def first_chunk(remaining):
+            chunks = iter(self.backend.stream(prompt, model, remaining, **options))
+            return chunks, next(chunks, None)
+
+        chunks, first = self._call(first_chunk, timeout)
+        if first is None:
+            return
+        yield first
+        yield from chunks
+
+    async def astream(self, prompt, model, timeout=None, **options):
+        """Like ``stream``, for the ASGI routes: chunks are awaited on the event loop."""
+        async def first_chunk(remaining):
+            chunks = aiter(self.backend.astream(prompt, model, remaining, **options))
+            return chunks, await anext(chunks, None)
+
+        chunks, first = await self._acall(first_chunk, timeout)
+        if first is None:
+            return
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+
+def create_llm_client_from_env(api_key=None):
+    """Build the LLMClient described by LLM_* environment variables.
+
+    LLM_BACKEND is "together" (default) or "fake". Returns None when the
+    Together backend is selected but no API key is configured.
+    """
+    backend_name = os.getenv("LLM_BACKEND", "together").lower()
+    if backend_name == "fake":
+        backend = FakeBackend(latency=float(os.getenv("LLM_FAKE_LATENCY", "0")))
+    elif backend_name == "together":
+        if not api_key:
+            return None
+        backend = TogetherBackend(
+            api_key,
+            pool_size=int(os.getenv("LLM_POOL_SIZE", "20")),
+            async_pool_size=int(os.getenv("LLM_ASYNC_POOL_SIZE", "200")),
+        )
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {backend_name}")
+
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    )
+    return LLMClient(
+        backend,
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        breaker=breaker,
+    )
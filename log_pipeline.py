@@ -0,0 +1,161 @@
+"""Non-blocking logging for the web apps.
+
+Request threads only put log records on an in-memory queue; a background
+``QueueListener`` thread formats them and does the actual I/O. When the
+queue is full, records are dropped (and counted) rather than making a
+request wait.
+
+Two streams go through this pipeline:
+
+- the application log (root logger), written to stderr as plain text or,
+  with ``LOG_FORMAT=json``, as one JSON object per line;
+- sampled prompt/response transcripts, written as JSONL to a size-capped,
+  rotating file (``results/transcripts.jsonl`` by default).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+QUEUE_SIZE = 10000
+
+_listeners = []
+_setup_lock = threading.Lock()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including any ``extra`` fields given."""
+
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _start_listener(logger, *handlers):
+    """Route ``logger`` through a bounded queue drained by a listener thread."""
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return queue_handler
+
+
+def _stop_listeners():
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(_stop_listeners)
+
+
+def setup_logging(level=None, fmt=None):
+    """Send the root logger through the queue to stderr.
+
+    ``level`` and ``fmt`` ("text" or "json") default to LOG_LEVEL and
+    LOG_FORMAT. Safe to call more than once; only the first call has an
+    effect.
+    """
+    root = logging.getLogger()
+    with _setup_lock:
+        if any(isinstance(handler, DroppingQueueHandler) for handler in root.handlers):
+            return
+        level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+        fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        if fmt == "json":
+            stream_handler.setFormatter(JSONFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        root.setLevel(level)
+        _start_listener(root, stream_handler)
+
+
+def dropped_log_records():
+    """Application log records dropped so far because the queue was full."""
+    return sum(
+        handler.dropped for handler in logging.getLogger().handlers if isinstance(handler, DroppingQueueHandler)
+    )
+
+
+class TranscriptLogger:
+    """Writes a sample of prompts and responses as JSONL to a rotating file.
+
+    ``sample_rate`` is the fraction of calls recorded (0 disables
+    transcripts). The file rotates at ``max_bytes`` and ``backup_count``
+    old files are kept, so the disk used is capped.
+    """
+
+    def __init__(self, path, sample_rate=0.1, max_bytes=5 * 1024 * 1024, backup_count=3):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._logger = logging.getLogger(f"transcripts.{path}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._queue_handler = None
+        if sample_rate > 0:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+            )
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            self._queue_handler = _start_listener(self._logger, file_handler)
+
+    @property
+    def dropped(self):
+        return self._queue_handler.dropped if self._queue_handler else 0
+
+    def log(self, call_site, prompt, response, **fields):
+        """Queue one transcript entry if this call is sampled."""
+        if self._queue_handler is None or random.random() >= self.sample_rate:
+            return
+        entry = {"time": time.time(), "call_site": call_site, "prompt": prompt, "response": response}
+        entry.update(fields)
+        self._logger.info(json.dumps(entry, default=str))
+
+
+def create_transcript_logger_from_env():
+    """Build the transcript logger configured by the TRANSCRIPT_* variables."""
+    return TranscriptLogger(
+        os.getenv("TRANSCRIPT_PATH", os.path.join("results", "transcripts.jsonl")),
+        sample_rate=float(os.getenv("TRANSCRIPT_SAMPLE_RATE", "0.1")),
+        max_bytes=int(os.getenv("TRANSCRIPT_MAX_BYTES", str(5 * 1024 * 1024))),
+        backup_count=int(os.getenv("TRANSCRIPT_BACKUPS", "3")),
+    )
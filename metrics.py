@@ -0,0 +1,248 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+A deliberately small stand-in for ``prometheus_client``: counters and
+histograms with labels, kept per worker process and rendered by the
+``/metrics`` route. ``AppMetrics`` declares the metrics both apps record
+and hooks request and template timing into a Flask app.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from flask.signals import before_render_template, template_rendered
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough to cover both template rendering and slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the time spent in the ``with`` block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self, items):
+        for key, state in items:
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, state["buckets"]):
+                yield f"{self.name}_bucket{_format_labels(pairs + [('le', f'{bound:g}')])} {count}"
+            yield f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {state['count']}"
+            yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(state['sum'])}"
+            yield f"{self.name}_count{_format_labels(pairs)} {state['count']}"
+
+
+class MetricsRegistry:
+    """Holds metrics in registration order and renders them together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class AppMetrics:
+    """The metrics recorded by app.py and bot.py.
+
+    - ``http_request_seconds``: request latency by route, method and status
+    - ``template_render_seconds``: Jinja rendering time by template
+    - ``llm_calls`` / ``llm_call_seconds``: LLM calls by call site and outcome
+      ("ok", "error" or "cache_hit")
+    - ``llm_fallbacks``: static/local fallbacks served, by call site and
+      reason ("parse_failure" or "error")
+    - ``storage_seconds``: recommendation storage timings by operation
+    - ``llm_tokens``: estimated prompt/completion tokens by call site and route
+    - ``faq_cache_lookups``: similarity cache lookups for chat by outcome
+      ("hit", "miss" or "bypass")
+    - ``profile_lookups``: stored recommendation lookups by outcome ("hit",
+      "miss", "normalized_hit" for hits only the canonical user ID finds, or
+      "legacy_hit" for records moved over from their pre-canonicalization ID)
+    - ``bundle_lookups``: precomputed bundle lookups by outcome ("hit" or "miss")
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.http_request_seconds = self.registry.histogram(
+            "http_request_duration_seconds", "Request latency by route.", ("route", "method", "status")
+        )
+        self.template_render_seconds = self.registry.histogram(
+            "template_render_duration_seconds", "Template rendering time.", ("template",)
+        )
+        self.llm_calls = self.registry.counter(
+            "llm_calls_total", "LLM calls by call site and outcome.", ("call_site", "outcome")
+        )
+        self.llm_call_seconds = self.registry.histogram(
+            "llm_call_duration_seconds", "LLM call latency by call site.", ("call_site", "outcome")
+        )
+        self.llm_fallbacks = self.registry.counter(
+            "llm_fallbacks_total", "Fallback content served instead of a parsed LLM response.", ("call_site", "reason")
+        )
+        self.storage_seconds = self.registry.histogram(
+            "storage_operation_duration_seconds", "Recommendation storage timings.", ("operation",)
+        )
+        self.llm_tokens = self.registry.counter(
+            "llm_tokens_total", "Estimated LLM tokens by call site, route and kind.", ("call_site", "route", "kind")
+        )
+
+        self.faq_cache_lookups = self.registry.counter(
+            "faq_cache_lookups_total", "Chat FAQ similarity cache lookups by outcome.", ("outcome",)
+        )
+        self.profile_lookups = self.registry.counter(
+            "profile_lookups_total", "Stored recommendation lookups by outcome.", ("outcome",)
+        )
+        self.bundle_lookups = self.registry.counter(
+            "bundle_lookups_total", "Precomputed bundle lookups for new profiles by outcome.", ("outcome",)
+        )
+
+    def record_tokens(self, call_site, route, prompt_tokens, completion_tokens):
+        self.llm_tokens.inc(prompt_tokens, call_site=call_site, route=route, kind="prompt")
+        self.llm_tokens.inc(completion_tokens, call_site=call_site, route=route, kind="completion")
+
+    @contextmanager
+    def llm_call(self, call_site):
+        """Time an LLM call; the block may set ``outcome["value"]`` before it ends."""
+        outcome = {"value": "ok"}
+        started = time.perf_counter()
+        try:
+            yield outcome
+        except Exception:
+            outcome["value"] = "error"
+            raise
+        finally:
+            self.llm_calls.inc(call_site=call_site, outcome=outcome["value"])
+            self.llm_call_seconds.observe(time.perf_counter() - started, call_site=call_site, outcome=outcome["value"])
+
+    def init_app(self, app):
+        """Record request latency and template rendering time for ``app``.
+
+        Streamed responses are timed until their headers are sent.
+        """
+
+        @app.before_request
+        def _start_timer():
+            g._metrics_started = time.perf_counter()
+
+        @app.after_request
+        def _observe_request(response):
+            started = g.pop("_metrics_started", None)
+            if started is not None:
+                route = request.url_rule.rule if request.url_rule else "<unmatched>"
+                self.http_request_seconds.observe(
+                    time.perf_counter() - started,
+                    route=route,
+                    method=request.method,
+                    status=response.status_code,
+                )
+            return response
+
+        def _start_template(sender, template, context, **extra):
+            g.setdefault("_metrics_templates", []).append(time.perf_counter())
+
+        def _observe_template(sender, template, context, **extra):
+            starts = g.get("_metrics_templates")
+            if starts:
+                self.template_render_seconds.observe(
+                    time.perf_counter() - starts.pop(), template=template.name or "<string>"
+                )
+
+        before_render_template.connect(_start_template, app, weak=False)
+        template_rendered.connect(_observe_template, app, weak=False)
+
+    def render(self):
+        return self.registry.render()
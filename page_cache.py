@@ -0,0 +1,98 @@
+"""Pre-rendered responses for the pages that take no template context.
+
+The landing, feature, login and dashboard pages render to the same bytes on
+every request. ``PageCache`` renders them once when the app starts and
+serves the stored body with a strong ETag (a hash of the body) and a
+Last-Modified time, answering ``If-None-Match``/``If-Modified-Since``
+requests with ``304 Not Modified``. Responses carry ``Cache-Control:
+no-cache``, so browsers revalidate and pick up a new deploy straight away.
+
+Pages are rendered fresh instead when the cache is disabled or the app
+reloads templates (``TEMPLATES_AUTO_RELOAD`` or debug mode).
+"""
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, render_template, request
+
+logger = logging.getLogger(__name__)
+
+
+def template_fingerprint(app, *extra):
+    """A hash of every template's source plus ``extra`` (JSON-serializable) values.
+
+    It changes whenever a deploy changes what pages render to, so it can go
+    into the ETags of pages rendered per request.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(app.jinja_env.list_templates()):
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+        digest.update(f"{name}\0{source}\0".encode("utf-8"))
+    digest.update(json.dumps(extra, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PageCache:
+    """Renders context-free templates once and serves them conditionally."""
+
+    def __init__(self, templates=(), enabled=True):
+        self.templates = tuple(templates)
+        self.enabled = enabled
+        self.hits = 0
+        self.not_modified = 0
+        self._pages = {}
+        self._app = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Pre-render every template for ``app``; call after its Jinja globals are set up."""
+        self._app = app
+        if not self.enabled:
+            return
+        with app.test_request_context("/"):
+            for template in self.templates:
+                self._render(template)
+        logger.info("Pre-rendered %s pages", len(self._pages))
+
+    def _render(self, template):
+        body = render_template(template).encode("utf-8")
+        page = {
+            "body": body,
+            "etag": hashlib.sha256(body).hexdigest()[:32],
+            "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+        }
+        with self._lock:
+            self._pages[template] = page
+        return page
+
+    def _use_cache(self):
+        return self.enabled and not (self._app and self._app.jinja_env.auto_reload)
+
+    def response(self, template):
+        """A response for ``template``, or ``304 Not Modified`` if the client's copy is current."""
+        if not self._use_cache():
+            return render_template(template)
+
+        page = self._pages.get(template) or self._render(template)
+        response = Response(page["body"], mimetype="text/html")
+        response.set_etag(page["etag"])
+        response.last_modified = page["last_modified"]
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        with self._lock:
+            self.hits += 1
+            if response.status_code == 304:
+                self.not_modified += 1
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self._use_cache(),
+                "pages": len(self._pages),
+                "hits": self.hits,
+                "not_modified": self.not_modified,
+            }
@@ -0,0 +1,146 @@
+"""Deterministic 6-week schedule planner.
+
+Builds the same ``{"week", "items", "completed", "progress"}`` structure as
+the LLM schedule prompt, but locally: each recommendation's ``duration``
+("8 months", "25 hours", "Self-paced", ...) is turned into an estimate of
+study hours, courses are ordered by ``level``, and the hours are packed
+into a fixed weekly time budget.
+"""
+import re
+
+WEEKS = 6
+
+# The schedule prompt asks for plans that fit into 2-4 hours per week
+DEFAULT_WEEKLY_HOURS = 3.0
+MIN_WEEKLY_HOURS = 2.0
+MAX_WEEKLY_HOURS = 4.0
+
+# A course "week" or "month" at the pace the platforms usually assume
+HOURS_PER_COURSE_WEEK = 4.0
+WEEKS_PER_MONTH = 4.3
+
+# Used when the duration is missing, "Self-paced" or can't be parsed
+DEFAULT_COURSE_HOURS = 12.0
+
+# A week's first course leaves at least this much room for the next one,
+# so one long course doesn't hide the rest of the path for six weeks
+MIN_SESSION_HOURS = 1.0
+MAX_COURSES_PER_WEEK = 3
+
+LEVEL_ORDER = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+_DURATION_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)(?:\s*(?:-|to|–)\s*(\d+(?:\.\d+)?))?\s*"
+    r"(minutes?|mins?|hours?|hrs?|h|days?|weeks?|wks?|months?|mos?)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_duration_hours(duration):
+    """Estimate the study hours behind a duration string.
+
+    Ranges use their midpoint ("2-3 weeks" is 2.5 weeks). Durations without
+    a recognizable number and unit fall back to DEFAULT_COURSE_HOURS.
+    """
+    match = _DURATION_PATTERN.search(str(duration or ""))
+    if not match:
+        return DEFAULT_COURSE_HOURS
+
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    amount = (low + high) / 2
+    unit = match.group(3).lower()
+
+    if unit.startswith("min"):
+        hours = amount / 60
+    elif unit.startswith("h"):
+        hours = amount
+    elif unit.startswith("d"):
+        hours = amount * HOURS_PER_COURSE_WEEK / 7
+    elif unit.startswith("w"):
+        hours = amount * HOURS_PER_COURSE_WEEK
+    else:
+        hours = amount * WEEKS_PER_MONTH * HOURS_PER_COURSE_WEEK
+    return max(hours, 0.5)
+
+
+def level_rank(level):
+    """Sort key for a level string; unknown levels sort last."""
+    level = str(level or "").lower()
+    for name, rank in LEVEL_ORDER.items():
+        if name in level:
+            return rank
+    return len(LEVEL_ORDER)
+
+
+def _round_half(hours):
+    return round(hours * 2) / 2
+
+
+def _format_hours(hours):
+    return f"{hours:g} h"
+
+
+def plan_schedule(recommendations, weekly_hours=DEFAULT_WEEKLY_HOURS, weeks=WEEKS):
+    """Pack the recommended courses into a ``weeks``-long schedule.
+
+    Courses are taken in level order, shortest first within a level. Each week
+    fills ``weekly_hours`` (clamped to 2-4) with up to three courses; the
+    course in progress always leaves room for the next one. Returns an empty
+    list when there are no usable recommendations.
+    """
+    weekly_hours = min(max(float(weekly_hours), MIN_WEEKLY_HOURS), MAX_WEEKLY_HOURS)
+    courses = [
+        {
+            "title": str(rec.get("title", "")).strip(),
+            "platform": str(rec.get("platform", "") or "").strip(),
+            "rank": level_rank(rec.get("level")),
+            "remaining": parse_duration_hours(rec.get("duration")),
+            "started": False,
+        }
+        for rec in recommendations or []
+        if isinstance(rec, dict) and str(rec.get("title", "")).strip()
+    ]
+    if not courses:
+        return []
+
+    # Easiest level first; within a level, quick wins before long courses
+    queue = sorted(courses, key=lambda course: (course["rank"], course["remaining"]))
+
+    schedule = []
+    for week in range(1, weeks + 1):
+        capacity = weekly_hours
+        items = []
+        position = 0
+        while capacity > 0 and position < len(queue) and len(items) < MAX_COURSES_PER_WEEK:
+            course = queue[position]
+            # The week's first course leaves room for the one after it
+            reserve = MIN_SESSION_HOURS if not items and position + 1 < len(queue) else 0
+            hours = _round_half(min(course["remaining"], capacity - reserve))
+            if hours <= 0:
+                position += 1
+                continue
+
+            label = course["title"]
+            if not course["started"] and course["platform"]:
+                label += f" ({course['platform']})"
+
+            if hours >= course["remaining"] - 0.25:
+                verb = "Complete" if not course["started"] else "Finish"
+                queue.pop(position)
+            else:
+                verb = "Start" if not course["started"] else "Continue"
+                course["remaining"] -= hours
+                position += 1
+            course["started"] = True
+            capacity -= hours
+            items.append(f"{verb} {label} - {_format_hours(hours)}")
+
+        if len(items) < 2:
+            items.append("Review notes and practice what you learned")
+        if week == weeks:
+            items.append("Plan next learning steps")
+
+        schedule.append({"week": week, "items": items, "completed": False, "progress": 0})
+
+    return schedule
@@ -0,0 +1,190 @@
+"""Canonical user IDs for stored recommendations.
+
+User IDs are a hash of the user's name, background and goal. Hashing the
+raw text makes "Learn ML." and "learn  machine learning" different users,
+so each part is canonicalized first:
+
+- Unicode NFKC normalization and case folding
+- punctuation folded to spaces and whitespace collapsed
+- synonyms expanded ("ml" -> "machine learning"), from ``SYNONYMS`` plus an
+  optional JSON map in ``PROFILE_SYNONYMS_PATH``
+- stop words dropped (``PROFILE_STOP_WORDS`` adds more) and repeated words
+  collapsed; word order is kept, since "from java to python" and "from
+  python to java" are different goals
+
+Names only get the first two steps. The tables are frozen here rather than
+shared with the chat cache: changing them changes user IDs. Any change to
+the canonical form must bump ``KEY_VERSION``, which is part of the hashed
+string, and keep the old scheme in ``ProfileNormalizer.previous_user_ids``
+so stored records can still be found. Run ``python profile_keys.py rekey``
+to move stored records to their current IDs; only records saved with their
+profile (name, background and goal) can be moved.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import unicodedata
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"[\w+#]+")
+
+# Version of the canonical form hashed into user IDs (1 was the sorted-words
+# form without a version prefix; the pre-canonicalization IDs are version 0)
+KEY_VERSION = 2
+
+# Words that say how someone phrases a goal rather than what it is
+PROFILE_STOP_WORDS = frozenset(
+    "a about also am an and any are as at be become best can could do does for from get good how i "
+    "if im in into is it just know like me my need of on or please really should so some take tell "
+    "that the there this to very want was way what when where which who why will with would you your".split()
+)
+
+# Common spellings that should map to the same user
+PROFILE_SYNONYMS = MappingProxyType({
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "js": "javascript",
+    "dev": "development",
+    "begin": "start",
+    "beginning": "start",
+    "started": "start",
+    "starting": "start",
+    "learned": "learn",
+    "learning": "learn",
+    "developers": "developer",
+    "engineers": "engineer",
+    "programming": "program",
+    "coding": "code",
+    "coder": "programmer",
+    "webdev": "web development",
+})
+
+
+def legacy_user_id(name, background, goal):
+    """The user ID as it was computed before canonicalization."""
+    user_string = f"{name.lower()}_{background.lower()}_{goal.lower()}"
+    return hashlib.md5(user_string.encode()).hexdigest()[:12]
+
+
+class ProfileNormalizer:
+    """Canonicalizes profiles and derives user IDs from them."""
+
+    def __init__(self, synonyms=None, stop_words=None):
+        self.synonyms = PROFILE_SYNONYMS if synonyms is None else synonyms
+        self.stop_words = PROFILE_STOP_WORDS if stop_words is None else frozenset(stop_words)
+
+    @staticmethod
+    def _words(text):
+        text = unicodedata.normalize("NFKC", text or "").casefold()
+        return _WORD_PATTERN.findall(text.replace("_", " "))
+
+    def _expand(self, word, seen=()):
+        replacement = self.synonyms.get(word)
+        if replacement is None or word in seen:
+            return [word]
+        seen = (*seen, word)
+        return [part for token in replacement.split() for part in self._expand(token, seen)]
+
+    def canonical_name(self, name):
+        return " ".join(self._words(name))
+
+    def _terms(self, text):
+        return [part for word in self._words(text) for part in self._expand(word) if part not in self.stop_words]
+
+    def canonical_text(self, text):
+        """Canonical form of a background or goal, in the user's word order."""
+        terms = []
+        for term in self._terms(text):
+            if not terms or terms[-1] != term:
+                terms.append(term)
+        return " ".join(terms)
+
+    def user_id(self, name, background, goal):
+        """Generate a user ID from the canonical form of the user's information."""
+        user_string = (
+            f"v{KEY_VERSION}:{self.canonical_name(name)}_{self.canonical_text(background)}_{self.canonical_text(goal)}"
+        )
+        return hashlib.md5(user_string.encode()).hexdigest()[:12]
+
+    def previous_user_ids(self, name, background, goal):
+        """The user's IDs under each earlier key version, newest first."""
+        # Version 1 hashed the de-duplicated words in sorted order
+        def sorted_text(text):
+            return " ".join(sorted(set(self._terms(text))))
+
+        user_string = f"{self.canonical_name(name)}_{sorted_text(background)}_{sorted_text(goal)}"
+        return [hashlib.md5(user_string.encode()).hexdigest()[:12], legacy_user_id(name, background, goal)]
+
+
+def create_normalizer_from_env():
+    """Build a ProfileNormalizer with the extra synonyms and stop words from the environment."""
+    synonyms = dict(PROFILE_SYNONYMS)
+    path = os.getenv("PROFILE_SYNONYMS_PATH")
+    if path:
+        try:
+            with open(path, "r") as f:
+                synonyms.update({key.casefold(): value.casefold() for key, value in json.load(f).items()})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Could not load profile synonyms %s: %s", path, e)
+    extra = {word.strip().casefold() for word in os.getenv("PROFILE_STOP_WORDS", "").split(",") if word.strip()}
+    return ProfileNormalizer(synonyms, PROFILE_STOP_WORDS | extra)
+
+
+def rekey_records(storage, normalizer):
+    """Move stored records to their canonical user IDs.
+
+    When several records map to the same ID, the most recently updated one
+    is kept. Returns ``(moved, skipped)``, where skipped records have no
+    stored profile to compute the canonical ID from.
+    """
+    moved = skipped = 0
+    for record in list(storage.records()):
+        profile = record.get("profile") or {}
+        if "name" not in profile:
+            skipped += 1
+            continue
+        user_id = normalizer.user_id(profile["name"], profile.get("background", ""), profile.get("goal", ""))
+        if user_id == record["user_id"]:
+            continue
+        storage.import_records([dict(record, user_id=user_id)])
+        storage.delete(record["user_id"])
+        moved += 1
+    return moved, skipped
+
+
+def adopt_legacy_record(storage, user_id, profile, normalizer):
+    """Move the record stored under one of ``profile``'s earlier IDs to ``user_id``.
+
+    Tries each key version in ``normalizer.previous_user_ids``, newest
+    first. This picks up records ``rekey_records`` cannot move, such as
+    those saved without a profile. Returns the moved record (with
+    ``profile`` stored on it if it had none), or None if there is no
+    record under an earlier ID.
+    """
+    for old_id in normalizer.previous_user_ids(profile["name"], profile["background"], profile["goal"]):
+        if old_id == user_id:
+            continue
+        record = storage.load(old_id)
+        if record is None:
+            continue
+        record = dict(record, user_id=user_id, profile=record.get("profile") or profile)
+        storage.import_records([record])
+        storage.delete(old_id)
+        return record
+    return None
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["rekey"]:
+        print("Usage: python profile_keys.py rekey")
+        sys.exit(1)
+
+    from storage import create_storage_from_env
+
+    moved, skipped = rekey_records(create_storage_from_env(), create_normalizer_from_env())
+    print(f"Moved {moved} records to canonical user IDs ({skipped} without a stored profile move when their user next visits)")
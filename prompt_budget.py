@@ -0,0 +1,150 @@
+"""Prompt size accounting and token budgets.
+
+- ``estimate_tokens`` approximates token counts (no tokenizer is needed).
+- ``fit_field`` truncates user-supplied text (background, goal, chat
+  message) to its per-field budget before it is put into a prompt.
+- ``UsageTracker`` records estimated prompt/completion tokens per call
+  site, per route and per user_id. The route and user_id come from context
+  variables, so calls made on worker threads are still attributed as long
+  as the work was submitted with the caller's context.
+"""
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Rough token estimate; close enough for budgeting English prompts
+CHARS_PER_TOKEN = 4
+
+# Tokens allowed for each user-supplied prompt field
+FIELD_BUDGETS = {
+    "background": int(os.getenv("PROMPT_BACKGROUND_TOKENS", "150")),
+    "goal": int(os.getenv("PROMPT_GOAL_TOKENS", "100")),
+    "message": int(os.getenv("PROMPT_MESSAGE_TOKENS", "300")),
+}
+
+TRUNCATION_MARKER = " [...]"
+
+_route = contextvars.ContextVar("usage_route", default=None)
+_user_id = contextvars.ContextVar("usage_user_id", default=None)
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in ``text``."""
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut ``text`` down to about ``max_tokens``, keeping the end (the newest part)."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return "..." + text[-(max_chars - 3):]
+
+
+def fit_field(text, field):
+    """Truncate a user-supplied field to its budget in FIELD_BUDGETS.
+
+    The start of the text is kept (it usually says the most) and cut at a
+    word boundary where possible.
+    """
+    text = text or ""
+    max_chars = FIELD_BUDGETS[field] * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - len(TRUNCATION_MARKER)]
+    if " " in cut[len(cut) // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+@contextmanager
+def usage_scope(route=None, user_id=None):
+    """Attribute LLM usage inside the block to ``route`` and/or ``user_id``."""
+    tokens = []
+    if route is not None:
+        tokens.append((_route, _route.set(route)))
+    if user_id is not None:
+        tokens.append((_user_id, _user_id.set(user_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class UsageTracker:
+    """Estimated token usage by call site, route and user_id.
+
+    At most ``max_users`` user_ids are tracked; the least recently active
+    ones are dropped first. ``on_record(call_site, route, prompt_tokens,
+    completion_tokens)`` is called for every recorded call, e.g. to update
+    metrics.
+    """
+
+    def __init__(self, max_users=10000, on_record=None):
+        self.max_users = max_users
+        self.on_record = on_record
+        self._by_call_site = {}
+        self._by_route = {}
+        self._by_user = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _add(table, key, prompt_tokens, completion_tokens):
+        usage = table.get(key)
+        if usage is None:
+            usage = table[key] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+
+    def record(self, call_site, prompt, completion, route=None):
+        """Record one LLM call for ``route`` (default: the current one) and user_id."""
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(completion)
+        route = route or _route.get() or "background"
+        user_id = _user_id.get()
+        with self._lock:
+            self._add(self._by_call_site, call_site, prompt_tokens, completion_tokens)
+            self._add(self._by_route, route, prompt_tokens, completion_tokens)
+            if user_id is not None:
+                self._add(self._by_user, user_id, prompt_tokens, completion_tokens)
+                self._by_user.move_to_end(user_id)
+                while len(self._by_user) > self.max_users:
+                    self._by_user.popitem(last=False)
+        if self.on_record:
+            self.on_record(call_site, route, prompt_tokens, completion_tokens)
+
+    def init_app(self, app):
+        """Attribute usage during each request to its route."""
+        from flask import g, request
+
+        @app.before_request
+        def _bind_route():
+            g._usage_route_token = _route.set(request.url_rule.rule if request.url_rule else "<unmatched>")
+
+        @app.teardown_request
+        def _unbind_route(exc):
+            token = g.pop("_usage_route_token", None)
+            if token is not None:
+                try:
+                    _route.reset(token)
+                except ValueError:
+                    # Torn down in a different context than it was set in
+                    _route.set(None)
+
+    def stats(self, top=20):
+        with self._lock:
+            top_users = sorted(
+                self._by_user.items(),
+                key=lambda item: item[1]["prompt_tokens"] + item[1]["completion_tokens"],
+                reverse=True,
+            )[:top]
+            return {
+                "by_call_site": {key: dict(value) for key, value in self._by_call_site.items()},
+                "by_route": {key: dict(value) for key, value in self._by_route.items()},
+                "users_tracked": len(self._by_user),
+                "top_users": [dict(value, user_id=user_id) for user_id, value in top_users],
+            }
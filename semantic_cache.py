@@ -0,0 +1,196 @@
+"""Similarity-based answer cache for chat questions.
+
+Questions are turned into sparse hashed TF-IDF vectors (words and word
+bigrams hashed into a fixed number of features), and a new question is
+answered from the cache when its cosine similarity to a stored question
+clears ``threshold``. Paraphrases such as "how do I start with ML" and
+"how should I get started with machine learning" share enough terms to
+match, while the IDF weighting keeps common words from dominating. The
+similarity is scaled down by the share of content words that either
+question has and the other lacks, so "how long to learn react" doesn't
+reuse the answer for "how long to learn react native".
+
+Pure Python: vectors are dicts of feature -> weight, and an inverted index
+from feature to entries keeps lookups proportional to the candidates that
+share a term rather than to the whole cache.
+"""
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_WORD_PATTERN = re.compile(r"[a-z0-9+#]+")
+
+STOP_WORDS = frozenset(
+    "a about am an and any are as at be best can could do does for from get good how i if in "
+    "into is it just know me my need of on or please should so some take tell that the there "
+    "this to want was way what when where which who why will with would you your".split()
+)
+
+# Common spellings that should match each other
+SYNONYMS = {
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "js": "javascript",
+    "dev": "development",
+    "begin": "start",
+    "beginning": "start",
+    "started": "start",
+    "starting": "start",
+    "learned": "learn",
+    "learning": "learn",
+}
+
+
+def _expand(word, seen=()):
+    """Expand ``word`` through SYNONYMS until no replacement applies."""
+    replacement = SYNONYMS.get(word)
+    if replacement is None or word in seen:
+        return [word]
+    seen = (*seen, word)
+    return [part for token in replacement.split() for part in _expand(token, seen)]
+
+
+def tokenize(text):
+    """Lowercase words (stop words removed, synonyms expanded) plus bigrams."""
+    words = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        for part in _expand(word):
+            if part not in STOP_WORDS:
+                words.append(part)
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def term_coverage(first, second):
+    """Share of the content words of ``first`` and of ``second`` found in the other, whichever is lower."""
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return min(shared / len(first), shared / len(second))
+
+
+def _terms(text):
+    return frozenset(token for token in tokenize(text) if " " not in token)
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "html", "features", "terms", "created_at")
+
+    def __init__(self, question, answer, html, features, terms):
+        self.question = question
+        self.answer = answer
+        self.html = html
+        self.features = features
+        self.terms = terms
+        self.created_at = time.time()
+
+
+class SemanticCache:
+    """Bounded cache of question/answer pairs looked up by similarity.
+
+    Holds at most ``max_entries`` pairs (least recently used evicted first),
+    each for ``ttl`` seconds.
+    """
+
+    def __init__(self, threshold=0.7, max_entries=500, ttl=24 * 3600, n_features=2 ** 18):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.n_features = n_features
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._postings = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _features(self, text):
+        counts = {}
+        for token in tokenize(text):
+            feature = zlib.crc32(token.encode("utf-8")) % self.n_features
+            counts[feature] = counts.get(feature, 0) + 1
+        return counts
+
+    def _idf(self, feature):
+        # Smoothed, with the query counted as one more document
+        documents = len(self._entries) + 1
+        return math.log((1 + documents) / (1 + len(self._postings.get(feature, ())) + 1)) + 1
+
+    def _weights(self, counts):
+        weights = {feature: (1 + math.log(count)) * self._idf(feature) for feature, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {feature: weight / norm for feature, weight in weights.items()} if norm else {}
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for feature in entry.features:
+            postings = self._postings.get(feature)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[feature]
+
+    def _expire(self, now):
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry.created_at <= self.ttl:
+                break
+            self._remove(entry_id)
+
+    def lookup(self, question):
+        """Return ``(answer, html, similarity)`` of the closest match, or None."""
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            query = self._weights(self._features(question))
+            query_terms = _terms(question)
+            best_id, best_score = None, 0.0
+            candidates = set()
+            for feature in query:
+                candidates.update(self._postings.get(feature, ()))
+            for entry_id in candidates:
+                # Entries that were hit recently sit behind the expiry sweep
+                if now - self._entries[entry_id].created_at > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                entry = self._entries[entry_id]
+                stored = self._weights(entry.features)
+                score = sum(weight * stored.get(feature, 0.0) for feature, weight in query.items())
+                score *= term_coverage(query_terms, entry.terms)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            entry = self._entries[best_id]
+            return entry.answer, entry.html, best_score
+
+    def add(self, question, answer, html=None):
+        """Store an answer for ``question``, optionally with its rendered HTML."""
+        features = self._features(question)
+        if not features:
+            return
+        with self._lock:
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(question, answer, html, features, _terms(question))
+            for feature in features:
+                self._postings.setdefault(feature, set()).add(entry_id)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,297 @@
+"""Server-side Flask sessions.
+
+Flask's default session serializes everything into a signed cookie, which
+the browser re-sends, and the app re-verifies, on every request. With
+``ServerSessionInterface`` the cookie carries only a random session ID and
+the data lives in a backend:
+
+- ``MemorySessionBackend``: a dict in the worker process, for a single
+  worker (sessions are lost on restart)
+- ``SQLiteSessionBackend``: a table in a SQLite file that every worker on the
+  host shares
+
+Sessions expire after ``ttl`` seconds without being used. Expired sessions
+are never loaded and are deleted by a sweep that runs at most every
+``sweep_interval`` seconds, during a request; ``python session_store.py
+sweep`` runs one from cron instead.
+"""
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+# secrets.token_urlsafe(32); anything else (e.g. an old signed cookie) starts a new session
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{43}$")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data plus the ID it is stored under."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.new = sid is None
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class MemorySessionBackend:
+    """Sessions in a dict, least recently saved first."""
+
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid, now):
+        """Return ``(data, expires_at)`` for a live session, or None."""
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= now:
+            return None
+        return dict(entry[0]), entry[1]
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (dict(data), expires_at)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def sweep(self, now):
+        """Delete expired sessions and return how many there were."""
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite table, serialized with Flask's tagged JSON."""
+
+    def __init__(self, path="user_data/sessions.sqlite3"):
+        self.path = path
+        self.serializer = TaggedJSONSerializer()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid, now):
+        """Return ``(data, expires_at)`` for a live session, or None."""
+        row = self._connect().execute(
+            "SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?", (sid, now)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return self.serializer.loads(row[0]), row[1]
+        except ValueError:
+            logger.warning("Discarding unreadable session data")
+            return None
+
+    def save(self, sid, data, expires_at):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+                (sid, self.serializer.dumps(dict(data)), expires_at),
+            )
+
+    def delete(self, sid):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def sweep(self, now):
+        """Delete expired sessions and return how many there were."""
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps session data in ``backend`` and only its ID in the cookie.
+
+    A session's expiry is pushed back to ``ttl`` seconds from now whenever
+    it is saved; unchanged sessions are re-saved once less than half of
+    their lifetime is left, so reading a session rarely writes to the backend.
+    """
+
+    def __init__(self, backend, ttl=7 * 24 * 3600, sweep_interval=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.swept = 0
+        self._last_sweep = time.time()
+        self._sweep_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        now = time.time()
+        self._maybe_sweep(now)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SESSION_ID_PATTERN.match(sid):
+            entry = self.backend.load(sid, now)
+            if entry is not None:
+                data, expires_at = entry
+                return ServerSideSession(data, sid=sid, expires_at=expires_at)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=self.get_cookie_secure(app),
+                    partitioned=self.get_cookie_partitioned(app),
+                    samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app),
+                )
+            return
+
+        now = time.time()
+        refresh = session.expires_at is not None and session.expires_at - now < self.ttl / 2
+        if not (session.modified or session.new or refresh):
+            return
+
+        self.backend.save(session.sid, session, now + self.ttl)
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                partitioned=self.get_cookie_partitioned(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            removed = self.backend.sweep(now)
+            self.swept += removed
+            if removed:
+                logger.info("Removed %s expired sessions", removed)
+        except Exception as e:
+            logger.error("Session sweep failed: %s", e)
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "sessions": len(self.backend),
+            "ttl": self.ttl,
+            "swept": self.swept,
+        }
+
+
+def create_session_backend_from_env():
+    """Build the backend selected by SESSION_BACKEND ("memory" or "sqlite"), or None for "cookie"."""
+    backend = os.getenv("SESSION_BACKEND", "sqlite").lower()
+    if backend == "cookie":
+        return None
+    if backend == "memory":
+        return MemorySessionBackend(max_sessions=int(os.getenv("SESSION_MAX_ENTRIES", "10000")))
+    if backend == "sqlite":
+        data_dir = os.getenv("USER_DATA_DIR", "user_data")
+        return SQLiteSessionBackend(os.getenv("SESSION_PATH", os.path.join(data_dir, "sessions.sqlite3")))
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+def create_session_interface_from_env():
+    """Server-side sessions configured from the environment, or None to keep cookie sessions."""
+    backend = create_session_backend_from_env()
+    if backend is None:
+        return None
+    return ServerSessionInterface(
+        backend,
+        ttl=float(os.getenv("SESSION_TTL", str(7 * 24 * 3600))),
+        sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "300")),
+    )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["sweep"]:
+        print("Usage: python session_store.py sweep")
+        sys.exit(1)
+
+    backend = create_session_backend_from_env()
+    if not isinstance(backend, SQLiteSessionBackend):
+        print("Only SQLite sessions can be swept from outside the app (SESSION_BACKEND=sqlite)")
+        sys.exit(1)
+    print(f"Removed {backend.sweep(time.time())} expired sessions")
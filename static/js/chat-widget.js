@@ -0,0 +1,250 @@
+// Chatbot widget shared by every page.
+//
+// Options come from data attributes on #chatbot-widget:
+// - data-history="local": keep the conversation and open/closed state in localStorage
+// - data-reset="true": clear the stored conversation when the page loads
+// - data-welcome: the greeting shown when there is no history
+const chatbotWidget = document.getElementById('chatbot-widget');
+const chatbotToggle = document.getElementById('chatbot-toggle');
+const chatbotMaximize = document.getElementById('chatbot-maximize');
+const chatbotContent = document.getElementById('chatbot-content');
+const chatbotMessages = document.getElementById('chatbot-messages');
+const chatbotInput = document.getElementById('chatbot-input-field');
+const chatbotSend = document.getElementById('chatbot-send');
+
+const persistHistory = chatbotWidget.dataset.history === 'local';
+const resetOnLoad = chatbotWidget.dataset.reset === 'true';
+const welcomeMessage = chatbotWidget.dataset.welcome ||
+    "Hi! I'm your AI Learning Mentor. Ask me anything about learning paths, courses, or career guidance! 🎓";
+
+// Chat history management
+const CHAT_HISTORY_KEY = 'ai_mentor_chat_history';
+const CHATBOT_STATE_KEY = 'ai_mentor_chatbot_state';
+
+// Load chatbot state from localStorage
+function loadChatbotState() {
+    const state = localStorage.getItem(CHATBOT_STATE_KEY);
+    if (state === 'open') {
+        chatbotWidget.classList.remove('collapsed');
+        chatbotToggle.textContent = '−';
+    } else {
+        chatbotWidget.classList.add('collapsed');
+        chatbotToggle.textContent = '+';
+    }
+}
+
+// Save chatbot state to localStorage
+function saveChatbotState(isOpen) {
+    if (!persistHistory) return;
+    localStorage.setItem(CHATBOT_STATE_KEY, isOpen ? 'open' : 'closed');
+}
+
+// Load chat history from localStorage
+function loadChatHistory() {
+    const history = localStorage.getItem(CHAT_HISTORY_KEY);
+    if (history) {
+        try {
+            const messages = JSON.parse(history);
+            messages.forEach(msg => {
+                addMessageToDOM(msg.text, msg.sender);
+            });
+        } catch (e) {
+            console.log('Error loading chat history:', e);
+        }
+    } else {
+        // Add welcome message if no history exists
+        addMessageToDOM(welcomeMessage, 'bot');
+    }
+}
+
+// Save chat history to localStorage
+function saveChatHistory(text, sender) {
+    const history = JSON.parse(localStorage.getItem(CHAT_HISTORY_KEY) || '[]');
+    history.push({ text, sender, timestamp: Date.now() });
+
+    // Keep only last 50 messages to prevent localStorage from getting too large
+    if (history.length > 50) {
+        history.splice(0, history.length - 50);
+    }
+
+    localStorage.setItem(CHAT_HISTORY_KEY, JSON.stringify(history));
+}
+
+// Add message to DOM and save to history
+function addMessage(text, sender) {
+    addMessageToDOM(text, sender);
+    if (persistHistory) {
+        saveChatHistory(text, sender);
+    }
+}
+
+// Add message to DOM only (for loading from history)
+function addMessageToDOM(text, sender) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `chatbot-message ${sender}-message`;
+    messageDiv.innerHTML = text;
+    chatbotMessages.appendChild(messageDiv);
+    chatbotMessages.scrollTop = chatbotMessages.scrollHeight;
+}
+
+// Clear chat history
+function clearChatHistory() {
+    localStorage.removeItem(CHAT_HISTORY_KEY);
+    chatbotMessages.innerHTML = '';
+    addMessageToDOM(welcomeMessage, 'bot');
+}
+
+// Toggle chatbot
+chatbotToggle.addEventListener('click', function() {
+    chatbotWidget.classList.toggle('collapsed');
+
+    // Update button text and save state
+    if (chatbotWidget.classList.contains('collapsed')) {
+        chatbotToggle.textContent = '+';
+        saveChatbotState(false);
+    } else {
+        chatbotToggle.textContent = '−';
+        saveChatbotState(true);
+    }
+});
+
+// Maximize chatbot (not every page has the button)
+chatbotMaximize && chatbotMaximize.addEventListener('click', function() {
+    chatbotWidget.classList.toggle('maximized');
+
+    // Update maximize button text
+    if (chatbotWidget.classList.contains('maximized')) {
+        chatbotMaximize.textContent = '⛶';
+        chatbotMaximize.title = 'Restore';
+    } else {
+        chatbotMaximize.textContent = '⛶';
+        chatbotMaximize.title = 'Maximize';
+    }
+});
+
+// Send message
+function sendMessage() {
+    const message = chatbotInput.value.trim();
+    if (!message) return;
+
+    // Add user message
+    addMessage(message, 'user');
+    chatbotInput.value = '';
+
+    // Show typing indicator
+    const typingDiv = document.createElement('div');
+    typingDiv.className = 'chatbot-message bot-message';
+    typingDiv.innerHTML = '🤖 Thinking...';
+    chatbotMessages.appendChild(typingDiv);
+    chatbotMessages.scrollTop = chatbotMessages.scrollHeight;
+
+    // Send to backend and render the reply as it streams in
+    fetch('/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ message: message })
+    })
+    .then(response => {
+        if (!response.ok || !response.body) {
+            throw new Error('Chat stream unavailable');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let html = '';
+        let pending = '';
+
+        // Finished blocks are HTML; the line still being written is plain text
+        function render() {
+            const pendingLine = document.createElement('p');
+            pendingLine.textContent = pending;
+            typingDiv.innerHTML = html + (pending ? pendingLine.outerHTML : '');
+            chatbotMessages.scrollTop = chatbotMessages.scrollHeight;
+        }
+
+        function handleEvent(raw) {
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+
+            const payload = JSON.parse(data);
+            if (event === 'token') {
+                pending += payload.text;
+                pending = pending.slice(pending.lastIndexOf('\n') + 1);
+            } else if (event === 'block') {
+                html += payload.html;
+            } else if (event === 'done') {
+                html = payload.html;
+                pending = '';
+            }
+            render();
+        }
+
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    // Replace the streaming bubble with the final message
+                    chatbotMessages.removeChild(typingDiv);
+                    addMessage(html, 'bot');
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                events.forEach(handleEvent);
+                return pump();
+            });
+        }
+
+        return pump();
+    })
+    .catch(error => {
+        // Remove typing indicator
+        if (typingDiv.parentNode) {
+            chatbotMessages.removeChild(typingDiv);
+        }
+
+        // Add error message
+        addMessage('Sorry, I encountered an error. Please try again.', 'bot');
+    });
+}
+
+// Event listeners
+chatbotSend.addEventListener('click', sendMessage);
+chatbotInput.addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        sendMessage();
+    }
+});
+
+// Load chat history and chatbot state when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    if (!persistHistory) return;
+    if (resetOnLoad) {
+        resetChatbot();
+    }
+    loadChatHistory();
+    loadChatbotState();
+});
+
+// Reset chatbot to initial state
+function resetChatbot() {
+    // Clear chat history
+    localStorage.removeItem(CHAT_HISTORY_KEY);
+    
+    // Reset chatbot state to closed
+    localStorage.setItem(CHATBOT_STATE_KEY, 'closed');
+    
+    // Clear any existing messages
+    chatbotMessages.innerHTML = '';
+}
@@ -0,0 +1,482 @@
+"""Storage for generated recommendations and schedules.
+
+Each record is a dict with ``user_id``, ``recommendations``, ``schedule``,
+``created_at`` and ``last_updated`` (ISO timestamps), the same shape the
+per-user JSON files have always had, plus the ``profile`` (``name``,
+``background`` and ``goal``) it was generated for, or None for older
+records.
+
+Two backends implement the same small interface (``save``, ``load``,
+``delete``, ``records``, ``timestamps``, ``profiles``, ``import_records``,
+``lock`` and its asyncio twin ``alock``):
+
+- ``SQLiteStorage`` (default): a single SQLite database in WAL mode with
+  indexed ``user_id``/``created_at`` columns and atomic upserts.
+- ``JSONStorage``: the original one-file-per-user layout in ``user_data/``,
+  now written atomically.
+
+``RecordIndex`` keeps every record's timestamps in memory so existence and
+freshness checks don't have to read the records themselves.
+
+Run ``python storage.py migrate`` to import existing ``user_data/*.json``
+files into the SQLite database. A database imports them automatically the
+first time it is opened (recorded in its ``meta`` table); malformed records
+are skipped with a warning.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _new_record(user_id, recommendations, schedule, profile=None):
+    now = datetime.now().isoformat()
+    return {
+        'user_id': user_id,
+        'recommendations': recommendations,
+        'schedule': schedule,
+        'profile': profile,
+        'created_at': now,
+        'last_updated': now,
+    }
+
+
+def _importable(record):
+    """True if ``record`` has every field a stored record needs; logs why not otherwise."""
+    if not isinstance(record, dict) or not record.get('user_id'):
+        logger.warning("Skipping record without a user_id")
+        return False
+    missing = [key for key in ('created_at', 'recommendations', 'schedule') if key not in record]
+    if missing:
+        logger.warning("Skipping malformed record %s: missing %s", record['user_id'], ", ".join(missing))
+        return False
+    return True
+
+
+@contextmanager
+def _hold_lock(storage, name, ttl, timeout, poll_interval):
+    """The polling loop behind each backend's ``lock``, built on its ``_try_lock``/``_unlock``."""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    waited = False
+    while not storage._try_lock(name, token, ttl):
+        waited = True
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for lock {name}")
+        time.sleep(poll_interval)
+    try:
+        yield waited
+    finally:
+        storage._unlock(name, token)
+
+
+@asynccontextmanager
+async def _ahold_lock(storage, name, ttl, timeout, poll_interval):
+    """Async ``_hold_lock``: each attempt runs on a thread, the waits don't hold one."""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    waited = False
+    while not await asyncio.to_thread(storage._try_lock, name, token, ttl):
+        waited = True
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for lock {name}")
+        await asyncio.sleep(poll_interval)
+    try:
+        yield waited
+    finally:
+        await asyncio.to_thread(storage._unlock, name, token)
+
+
+class JSONStorage:
+    """One pretty-printed JSON file per user under ``directory``."""
+
+    def __init__(self, directory='user_data'):
+        self.directory = directory
+
+    def _path(self, user_id):
+        return os.path.join(self.directory, f'{user_id}.json')
+
+    def save(self, user_id, recommendations, schedule, profile=None):
+        """Write the record atomically (temp file + rename) and return it."""
+        record = _new_record(user_id, recommendations, schedule, profile)
+        self._write(record)
+        return record
+
+    def _write(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        user_id = record['user_id']
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f'.{user_id}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(record, f, indent=2)
+            os.replace(tmp_path, self._path(user_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, user_id):
+        """Return the stored record, or None if there is none."""
+        try:
+            with open(self._path(user_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, user_id):
+        """Remove the user's record if there is one."""
+        try:
+            os.unlink(self._path(user_id))
+        except FileNotFoundError:
+            pass
+
+    def import_records(self, records):
+        """Write records from elsewhere, keeping whichever copy is newer."""
+        count = 0
+        for record in records:
+            if not _importable(record):
+                continue
+            existing = self.load(record['user_id'])
+            last_updated = record.get('last_updated', record['created_at'])
+            if existing is None or last_updated > existing.get('last_updated', existing['created_at']):
+                self._write(record)
+            count += 1
+        return count
+
+    def lock(self, name, ttl=120, timeout=120, poll_interval=0.2):
+        """Hold a cross-process lock implemented as an exclusive lock file.
+
+        Yields True if the lock was held by someone else and had to be waited
+        for. Lock files older than ``ttl`` seconds are treated as abandoned.
+        Raises TimeoutError if the lock can't be taken within ``timeout``.
+        """
+        return _hold_lock(self, name, ttl, timeout, poll_interval)
+
+    def alock(self, name, ttl=120, timeout=120, poll_interval=0.2):
+        """Like ``lock``, for coroutines: waits with asyncio.sleep and touches the disk on a thread."""
+        return _ahold_lock(self, name, ttl, timeout, poll_interval)
+
+    def _lock_path(self, name):
+        lock_dir = os.path.join(self.directory, '.locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        return os.path.join(lock_dir, f'{name}.lock')
+
+    def _try_lock(self, name, token, ttl):
+        path = self._lock_path(name)
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > ttl:
+                        os.unlink(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+            return False
+
+    def _unlock(self, name, token):
+        try:
+            os.unlink(self._lock_path(name))
+        except FileNotFoundError:
+            pass
+
+    def records(self):
+        """Yield every stored record."""
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.json'))):
+            try:
+                with open(path, 'r') as f:
+                    yield json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable record %s: %s", path, e)
+
+    def timestamps(self):
+        """Yield ``(user_id, created_at, last_updated)`` for every record."""
+        for record in self.records():
+            yield record['user_id'], record['created_at'], record.get('last_updated', record['created_at'])
+
+    def profiles(self):
+        """Yield ``(user_id, profile)`` for every record that has a profile."""
+        for record in self.records():
+            if record.get('profile'):
+                yield record['user_id'], record['profile']
+
+
+class SQLiteStorage:
+    """All records in one SQLite database using write-ahead logging."""
+
+    def __init__(self, path='user_data/recommendations.sqlite3', import_from=None):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_recommendations ("
+                " user_id TEXT PRIMARY KEY,"
+                " recommendations TEXT NOT NULL,"
+                " schedule TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " last_updated TEXT NOT NULL,"
+                " profile TEXT)"
+            )
+            # Databases created before profiles were stored
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(user_recommendations)")}
+            if 'profile' not in columns:
+                conn.execute("ALTER TABLE user_recommendations ADD COLUMN profile TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_user_recommendations_created_at"
+                " ON user_recommendations (created_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS locks ("
+                " name TEXT PRIMARY KEY,"
+                " token TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        if import_from:
+            self._import_once(conn, import_from)
+
+    def _import_once(self, conn, directory):
+        """Import the JSON records in ``directory`` unless this database already has.
+
+        The import and the meta row marking it done are written in one
+        transaction, so an interrupted import is retried on the next start.
+        """
+        with conn:
+            # Taken up front so concurrently starting workers import only once
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_import'").fetchone():
+                return
+            imported = self._import(conn, JSONStorage(directory).records())
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_import', ?)", (datetime.now().isoformat(),)
+            )
+        if imported:
+            logger.info("Imported %s records from %s/ into %s", imported, directory, self.path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_record(row):
+        return {
+            'user_id': row['user_id'],
+            'recommendations': json.loads(row['recommendations']),
+            'schedule': json.loads(row['schedule']),
+            'profile': json.loads(row['profile']) if row['profile'] else None,
+            'created_at': row['created_at'],
+            'last_updated': row['last_updated'],
+        }
+
+    def _upsert(self, conn, record, only_if_newer=False):
+        sql = (
+            "INSERT INTO user_recommendations"
+            " (user_id, recommendations, schedule, created_at, last_updated, profile)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(user_id) DO UPDATE SET"
+            " recommendations = excluded.recommendations,"
+            " schedule = excluded.schedule,"
+            " created_at = excluded.created_at,"
+            " last_updated = excluded.last_updated,"
+            " profile = COALESCE(excluded.profile, user_recommendations.profile)"
+        )
+        if only_if_newer:
+            sql += " WHERE excluded.last_updated > user_recommendations.last_updated"
+        conn.execute(sql, (
+            record['user_id'],
+            json.dumps(record['recommendations']),
+            json.dumps(record['schedule']),
+            record['created_at'],
+            record.get('last_updated', record['created_at']),
+            json.dumps(record['profile']) if record.get('profile') else None,
+        ))
+
+    def save(self, user_id, recommendations, schedule, profile=None):
+        """Insert or replace the user's record in one transaction and return it."""
+        record = _new_record(user_id, recommendations, schedule, profile)
+        conn = self._connect()
+        with conn:
+            self._upsert(conn, record)
+        return record
+
+    def load(self, user_id):
+        """Return the stored record, or None if there is none."""
+        row = self._connect().execute(
+            "SELECT * FROM user_recommendations WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def delete(self, user_id):
+        """Remove the user's record if there is one."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM user_recommendations WHERE user_id = ?", (user_id,))
+
+    def lock(self, name, ttl=120, timeout=120, poll_interval=0.2):
+        """Hold a cross-process lock stored as a row in the ``locks`` table.
+
+        Yields True if the lock was held by someone else and had to be waited
+        for. Locks older than ``ttl`` seconds are treated as abandoned.
+        Raises TimeoutError if the lock can't be taken within ``timeout``.
+        """
+        return _hold_lock(self, name, ttl, timeout, poll_interval)
+
+    def alock(self, name, ttl=120, timeout=120, poll_interval=0.2):
+        """Like ``lock``, for coroutines: waits with asyncio.sleep and queries the database on a thread."""
+        return _ahold_lock(self, name, ttl, timeout, poll_interval)
+
+    def _try_lock(self, name, token, ttl):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND expires_at <= ?", (name, now))
+            return conn.execute(
+                "INSERT OR IGNORE INTO locks (name, token, expires_at) VALUES (?, ?, ?)",
+                (name, token, now + ttl),
+            ).rowcount == 1
+
+    def _unlock(self, name, token):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+    def records(self):
+        """Yield every stored record, oldest first."""
+        rows = self._connect().execute("SELECT * FROM user_recommendations ORDER BY created_at").fetchall()
+        for row in rows:
+            yield self._row_to_record(row)
+
+    def timestamps(self):
+        """Yield ``(user_id, created_at, last_updated)`` without reading the payloads."""
+        rows = self._connect().execute(
+            "SELECT user_id, created_at, last_updated FROM user_recommendations"
+        ).fetchall()
+        for row in rows:
+            yield row['user_id'], row['created_at'], row['last_updated']
+
+    def profiles(self):
+        """Yield ``(user_id, profile)`` for every record that has a profile."""
+        rows = self._connect().execute(
+            "SELECT user_id, profile FROM user_recommendations WHERE profile IS NOT NULL"
+        ).fetchall()
+        for row in rows:
+            yield row['user_id'], json.loads(row['profile'])
+
+    def import_records(self, records):
+        """Upsert records from another backend, keeping whichever copy is newer."""
+        conn = self._connect()
+        with conn:
+            return self._import(conn, records)
+
+    def _import(self, conn, records):
+        count = 0
+        for record in records:
+            if not _importable(record):
+                continue
+            self._upsert(conn, record, only_if_newer=True)
+            count += 1
+        return count
+
+
+class RecordIndex:
+    """In-memory map of user_id to ``(created_at, last_updated)``.
+
+    Built once from a backend's ``timestamps()`` and kept in sync by calling
+    ``update`` with every record that is saved or loaded.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.build_seconds = None
+        self.built_at = None
+
+    def build(self, storage):
+        """Replace the index with the timestamps of every stored record."""
+        started = time.perf_counter()
+        entries = {user_id: (created_at, last_updated) for user_id, created_at, last_updated in storage.timestamps()}
+        with self._lock:
+            self._entries = entries
+            self.build_seconds = time.perf_counter() - started
+            self.built_at = datetime.now().isoformat()
+        return len(entries)
+
+    def update(self, record):
+        """Record the timestamps of a saved or freshly loaded record."""
+        with self._lock:
+            self._entries[record['user_id']] = (
+                record['created_at'],
+                record.get('last_updated', record['created_at']),
+            )
+
+    def remove(self, user_id):
+        """Forget a record that was deleted or moved."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def get(self, user_id):
+        """Return ``(created_at, last_updated)`` for the user, or None."""
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "build_seconds": self.build_seconds,
+            "built_at": self.built_at,
+        }
+
+
+def create_storage_from_env():
+    """Build the storage backend selected by STORAGE_BACKEND ("sqlite" or "json")."""
+    backend = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+    data_dir = os.getenv('USER_DATA_DIR', 'user_data')
+
+    if backend == 'json':
+        return JSONStorage(data_dir)
+    if backend == 'sqlite':
+        path = os.getenv('STORAGE_PATH', os.path.join(data_dir, 'recommendations.sqlite3'))
+        return SQLiteStorage(path, import_from=data_dir)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ['migrate']:
+        print("Usage: python storage.py migrate [json_dir] [sqlite_path]")
+        sys.exit(1)
+
+    json_dir = sys.argv[2] if len(sys.argv) > 2 else os.getenv('USER_DATA_DIR', 'user_data')
+    sqlite_path = sys.argv[3] if len(sys.argv) > 3 else os.getenv(
+        'STORAGE_PATH', os.path.join(json_dir, 'recommendations.sqlite3')
+    )
+    imported = SQLiteStorage(sqlite_path).import_records(JSONStorage(json_dir).records())
+    print(f"Imported {imported} records from {json_dir}/ into {sqlite_path}")
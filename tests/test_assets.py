@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import assets
+
+BUNDLES = {"site.css": ["a.css", "b.css"]}
+
+
+def make_sources(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "a.css").write_text("body { color: red; }\n" * 40)
+    (static / "b.css").write_text("p { margin: 0; }\n")
+    return str(static), str(tmp_path / "dist")
+
+
+def test_concurrent_builds_do_not_collide(tmp_path):
+    static, dist = make_sources(tmp_path)
+
+    def build(_):
+        return assets.build(static, dist, BUNDLES)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        manifests = list(executor.map(build, range(30)))
+
+    assert all(manifest == manifests[0] for manifest in manifests)
+
+
+def test_cleanup_keeps_temp_files_and_recent_builds(tmp_path):
+    static, dist = make_sources(tmp_path)
+    assets.build(static, dist, BUNDLES)
+    (tmp_path / "dist" / ".site.css.other.tmp").write_text("in progress")
+    (tmp_path / "dist" / "site.0123456789ab.css").write_text("previous build")
+
+    assets.build(static, dist, BUNDLES)
+
+    assert (tmp_path / "dist" / ".site.css.other.tmp").exists()
+    assert (tmp_path / "dist" / "site.0123456789ab.css").exists()
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+
+from jobs import Job, JobQueue, QueueFullError
+
+
+def blocked_queue(max_pending=100):
+    """A one-worker queue plus an event that jobs submitted as ``release.wait`` block on."""
+    return JobQueue(max_workers=1, max_pending=max_pending), threading.Event()
+
+
+def test_submit_raises_when_max_pending_jobs_are_unfinished():
+    queue, release = blocked_queue(max_pending=2)
+    queue.submit(release.wait)
+    queue.submit(release.wait)
+
+    with pytest.raises(QueueFullError):
+        queue.submit(release.wait)
+    release.set()
+
+
+def test_finished_jobs_free_their_pending_slot():
+    queue = JobQueue(max_workers=1, max_pending=1)
+    job = queue.submit(lambda: "done")
+    assert job.wait(5)
+
+    assert queue.submit(lambda: "again").wait(5)
+
+
+def test_find_returns_the_unfinished_job_for_a_key():
+    queue, release = blocked_queue()
+    job = queue.submit(release.wait, key="user:generate")
+    queue.submit(release.wait, key="other:generate")
+
+    assert queue.find("user:generate") is job
+    assert queue.find("missing") is None
+
+    release.set()
+    assert job.wait(5)
+    assert queue.find("user:generate") is None
+
+
+def test_completed_job_records_result_status_and_finish_time():
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(lambda a, b: a + b, 1, 2)
+
+    assert job.wait(5)
+    assert job.status == Job.DONE
+    assert job.result == 3
+    assert job.finished_at is not None and job.finished_at >= job.created_at
+    assert queue.get(job.id) is job
+
+
+def test_failed_job_records_error_status_and_finish_time():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    job = JobQueue(max_workers=1).submit(fail)
+
+    assert job.wait(5)
+    assert job.status == Job.FAILED
+    assert job.error == "upstream down"
+    assert job.result is None
+    assert job.finished_at is not None
+
+
+def test_wait_async_times_out_without_leaving_a_callback():
+    queue, release = blocked_queue()
+    job = queue.submit(release.wait)
+
+    assert asyncio.run(job.wait_async(0.05)) is False
+    assert job._callbacks == []
+
+    release.set()
+    assert job.wait(5)
+
+
+def test_wait_async_returns_when_the_job_finishes():
+    queue, release = blocked_queue()
+    job = queue.submit(release.wait)
+
+    async def wait():
+        waiter = asyncio.ensure_future(job.wait_async(5))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await waiter
+
+    assert asyncio.run(wait()) is True
+    assert job.status == Job.DONE
+    assert job._callbacks == []
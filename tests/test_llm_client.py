@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, DeadlineExceededError, FakeBackend, LLMClient
+
+
+def make_client(backend, threshold=100, reset_timeout=30.0, **options):
+    options.setdefault("backoff_base", 0)
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    return LLMClient(backend, breaker=breaker, **options)
+
+
+def open_breaker(client):
+    with pytest.raises(ConnectionError):
+        client.complete("prompt", "model")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_opens_after_the_failure_threshold():
+    backend = FakeBackend(failures=[ConnectionError()] * 2)
+    client = make_client(backend, threshold=2, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            client.complete("prompt", "model")
+
+    with pytest.raises(CircuitOpenError):
+        client.complete("prompt", "model")
+    assert backend.calls == 2
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_breaker():
+    backend = FakeBackend(failures=[ConnectionError()])
+    client = make_client(backend, threshold=1, reset_timeout=0.05, max_retries=0)
+    open_breaker(client)
+    time.sleep(0.06)
+
+    assert client.complete("prompt", "model")
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker_and_frees_the_slot():
+    backend = FakeBackend(failures=[ConnectionError()] * 2)
+    client = make_client(backend, threshold=1, reset_timeout=0.05, max_retries=0)
+    open_breaker(client)
+    time.sleep(0.06)
+
+    with pytest.raises(ConnectionError):
+        client.complete("prompt", "model")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.complete("prompt", "model")
+
+    time.sleep(0.06)
+    assert client.complete("prompt", "model")
+    assert backend.calls == 3
+
+
+def test_interrupted_trial_frees_the_slot():
+    backend = FakeBackend(failures=[ConnectionError(), KeyboardInterrupt()])
+    client = make_client(backend, threshold=1, reset_timeout=0, max_retries=0)
+    open_breaker(client)
+
+    with pytest.raises(KeyboardInterrupt):
+        client.complete("prompt", "model")
+
+    assert client.breaker.allow()
+
+
+def test_deadline_cuts_retries_short():
+    backend = FakeBackend(latency=0.2)
+    client = make_client(backend, max_retries=5, backoff_base=0.01)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        client.complete("prompt", "model", timeout=0.1)
+
+    assert backend.calls == 1
+    assert time.monotonic() - started < 0.2
+
+
+def test_retries_stop_at_max_retries():
+    backend = FakeBackend(failures=[ConnectionError()] * 5)
+    client = make_client(backend, max_retries=2)
+
+    with pytest.raises(ConnectionError):
+        client.complete("prompt", "model")
+
+    assert backend.calls == 3
+
+
+def test_retries_recover_within_max_retries():
+    backend = FakeBackend(responder=lambda prompt: "ok", failures=[TimeoutError()] * 2)
+    client = make_client(backend, max_retries=2)
+
+    assert client.complete("prompt", "model") == "ok"
+    assert backend.calls == 3
+    assert client.breaker.failures == 0
+
+
+def test_non_retryable_errors_are_not_retried():
+    backend = FakeBackend(failures=[ValueError("bad request")])
+    client = make_client(backend, max_retries=2)
+
+    with pytest.raises(ValueError):
+        client.complete("prompt", "model")
+
+    assert backend.calls == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
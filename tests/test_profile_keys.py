@@ -0,0 +1,44 @@
+import hashlib
+
+from profile_keys import ProfileNormalizer, adopt_legacy_record, legacy_user_id
+from storage import SQLiteStorage
+
+
+def test_canonical_text_keeps_word_order():
+    normalizer = ProfileNormalizer()
+
+    assert normalizer.canonical_text("Move from Java to Python") == "move java python"
+    assert normalizer.user_id("Ana", "dev", "move from java to python") != normalizer.user_id(
+        "Ana", "dev", "move from python to java"
+    )
+
+
+def test_canonical_text_collapses_repeats_and_expands_synonyms():
+    normalizer = ProfileNormalizer()
+
+    assert normalizer.canonical_text("Python, python developer") == "python developer"
+    assert normalizer.canonical_text("Learn ML.") == normalizer.canonical_text("learn  machine learning")
+
+
+def test_previous_user_ids_cover_the_sorted_and_legacy_schemes():
+    normalizer = ProfileNormalizer()
+    sorted_id = hashlib.md5("ana_java move python_data".encode()).hexdigest()[:12]
+
+    assert normalizer.previous_user_ids("Ana", "move from java to python", "data") == [
+        sorted_id, legacy_user_id("Ana", "move from java to python", "data"),
+    ]
+
+
+def test_adopt_legacy_record_moves_a_record_from_an_earlier_version(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "db.sqlite3"))
+    normalizer = ProfileNormalizer()
+    profile = {"name": "Ana", "background": "java developer", "goal": "learn ML"}
+    old_id = normalizer.previous_user_ids(profile["name"], profile["background"], profile["goal"])[0]
+    storage.save(old_id, [{"title": "Course"}], [])
+    user_id = normalizer.user_id(profile["name"], profile["background"], profile["goal"])
+
+    record = adopt_legacy_record(storage, user_id, profile, normalizer)
+
+    assert record["user_id"] == user_id and record["profile"] == profile
+    assert storage.load(old_id) is None
+    assert storage.load(user_id)["recommendations"] == [{"title": "Course"}]
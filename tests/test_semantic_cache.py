@@ -0,0 +1,25 @@
+from semantic_cache import SemanticCache, tokenize
+
+
+def test_abbreviations_expand_to_the_same_tokens():
+    assert tokenize("how do I start with ML") == tokenize("how do I start with machine learning")
+
+
+def test_paraphrased_question_is_answered_from_the_cache():
+    cache = SemanticCache()
+    cache.add("how do I start with machine learning", "Start with Python.")
+    match = cache.lookup("how do I start with ML")
+    assert match is not None
+    assert match[0] == "Start with Python."
+
+
+def test_unrelated_question_misses():
+    cache = SemanticCache()
+    cache.add("how do I start with machine learning", "Start with Python.")
+    assert cache.lookup("what is the best javascript framework") is None
+
+
+def test_question_missing_a_stored_term_misses():
+    cache = SemanticCache()
+    cache.add("how long to learn react native", "About two months.")
+    assert cache.lookup("how long to learn react") is None
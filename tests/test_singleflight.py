@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Call ``flight.do(key, fn)`` from ``callers`` threads at once; return their futures."""
+    pool = ThreadPoolExecutor(max_workers=callers)
+    futures = [pool.submit(flight.do, key, fn) for _ in range(callers)]
+    pool.shutdown(wait=False)
+    return futures
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    futures = run_concurrently(flight, "user:generate", work, 5)
+    assert started.wait(5)
+    while flight.shared < 4:
+        time.sleep(0.01)
+    release.set()
+
+    assert [future.result(5) for future in futures] == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_concurrent_callers_share_the_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    futures = run_concurrently(flight, "user:generate", work, 3)
+    while flight.shared < 2:
+        time.sleep(0.01)
+    release.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="upstream down"):
+            future.result(5)
+    assert len(calls) == 1
+
+
+def test_different_keys_do_not_block_each_other():
+    flight = SingleFlight()
+    release = threading.Event()
+    blocked = run_concurrently(flight, "slow", lambda: release.wait(5), 1)[0]
+
+    assert flight.do("fast", lambda: "fast") == "fast"
+    assert not blocked.done()
+    release.set()
+    assert blocked.result(5) is True
+
+
+def test_a_finished_call_is_not_reused():
+    flight = SingleFlight()
+    results = iter(["first", "second"])
+
+    assert flight.do("key", lambda: next(results)) == "first"
+    assert flight.do("key", lambda: next(results)) == "second"
+    assert flight.shared == 0
+
+
+def test_async_callers_share_one_task():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work, 21) for _ in range(4)))
+
+    assert asyncio.run(main()) == [42] * 4
+    assert calls == [21]
+    assert flight.shared == 3
+
+
+def test_async_call_survives_a_cancelled_caller():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
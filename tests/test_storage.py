@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from storage import JSONStorage, SQLiteStorage
+
+
+def write_legacy(directory, record):
+    with open(directory / f"{record['user_id']}.json", "w") as f:
+        json.dump(record, f)
+
+
+def test_import_skips_malformed_records_and_keeps_the_rest(tmp_path):
+    write_legacy(tmp_path, {"user_id": "bad", "created_at": "2024-01-01T00:00:00"})
+    write_legacy(tmp_path, {
+        "user_id": "good", "created_at": "2024-01-01T00:00:00", "recommendations": [], "schedule": [],
+    })
+    path = str(tmp_path / "db.sqlite3")
+
+    SQLiteStorage(path, import_from=str(tmp_path))
+    reopened = SQLiteStorage(path, import_from=str(tmp_path))
+
+    assert [record["user_id"] for record in reopened.records()] == ["good"]
+
+
+def test_import_runs_once_per_database(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    SQLiteStorage(path, import_from=str(tmp_path))
+    write_legacy(tmp_path, {
+        "user_id": "late", "created_at": "2024-01-01T00:00:00", "recommendations": [], "schedule": [],
+    })
+
+    assert SQLiteStorage(path, import_from=str(tmp_path)).load("late") is None
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return JSONStorage(str(tmp_path / "records"))
+    return SQLiteStorage(str(tmp_path / "db.sqlite3"))
+
+
+def test_lock_is_mutually_exclusive(storage):
+    with storage.lock("generate-user") as waited:
+        assert waited is False
+        with pytest.raises(TimeoutError):
+            with storage.lock("generate-user", timeout=0.1, poll_interval=0.02):
+                pass
+        # Other names are independent
+        with storage.lock("generate-other") as other_waited:
+            assert other_waited is False
+
+    with storage.lock("generate-user", timeout=0.1) as waited:
+        assert waited is False
+
+
+def test_lock_reports_waiting_for_the_holder(storage):
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with storage.lock("generate-user"):
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert held.wait(5)
+    threading.Timer(0.1, release.set).start()
+
+    with storage.lock("generate-user", timeout=5, poll_interval=0.02) as waited:
+        assert waited is True
+    holder.join(5)
+
+
+def test_abandoned_lock_expires_after_its_ttl(storage):
+    with storage.lock("generate-user", ttl=0.05):
+        time.sleep(0.1)
+        with storage.lock("generate-user", ttl=0.05, timeout=0.5, poll_interval=0.02):
+            pass
+
+
+def test_alock_excludes_lock_and_reports_waiting(storage):
+    held = threading.Event()
+
+    def hold_briefly():
+        with storage.lock("generate-user"):
+            held.set()
+            time.sleep(0.1)
+
+    async def main():
+        async with storage.alock("generate-user") as waited:
+            assert waited is False
+            with pytest.raises(TimeoutError):
+                async with storage.alock("generate-user", timeout=0.1, poll_interval=0.02):
+                    pass
+
+        holder = threading.Thread(target=hold_briefly)
+        holder.start()
+        await asyncio.to_thread(held.wait, 5)
+        async with storage.alock("generate-user", timeout=5, poll_interval=0.02) as waited:
+            assert waited is True
+        holder.join(5)
+
+    asyncio.run(main())